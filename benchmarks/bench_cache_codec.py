@@ -0,0 +1,165 @@
+"""
+キャッシュのシリアライズ形式のベンチマーク。
+
+引数で渡した取得済みのAPI応答（JSONファイル）を
+各形式（旧来のindent付きJSON・コンパクトJSON・marshal・marshal+zlib）で保存・読み込みし、
+1件あたりのエンコード時間・デコード時間・サイズをJSONで出力する。
+引数がなければ、プレイヤーのfullResultを模した合成データで計測する。
+cache/ 以下には描画用に絞った PlayerSummary/GuildSummary しか残らないため、
+それを測りたいときだけ --from-cache を付ける。
+どの種類のデータを測ったかは結果の "kind" に出る
+（raw_response: API応答そのもの / cache_projection: cache/ の射影 / synthetic_full_response: 合成データ）。
+
+    python benchmarks/bench_cache_codec.py --iterations 50 --output bench_cache_codec.json
+    python benchmarks/bench_cache_codec.py captured/player_*.json
+    python benchmarks/bench_cache_codec.py --from-cache
+"""
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import glob
+import json
+import logging
+import random
+import statistics
+import time
+from datetime import datetime
+
+from lib.cache_codec import CacheCodecError, JsonCodec, MarshalCodec
+from lib.cache_handler import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+class IndentedJsonCodec(JsonCodec):
+    """変更前の保存形式（json.dump(..., indent=4, ensure_ascii=False)）"""
+    name = "json-indent4"
+
+    def encode(self, timestamp: datetime, data) -> bytes:
+        return json.dumps({'timestamp': timestamp.isoformat(), 'data': data}, ensure_ascii=False, indent=4).encode('utf-8')
+
+CODECS = [IndentedJsonCodec(), JsonCodec(), MarshalCodec(compress_level=None), MarshalCodec(compress_level=1), MarshalCodec(compress_level=6)]
+
+KIND_RAW = "raw_response"
+KIND_CACHE = "cache_projection"
+KIND_SYNTHETIC = "synthetic_full_response"
+
+def load_payloads(paths: list[str]) -> dict[str, tuple[str, object]]:
+    """キャッシュファイル・APIのJSONを読み、{名前: (種類, data)} を返す"""
+    decoders = [JsonCodec(), MarshalCodec()]
+    payloads = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            raw = f.read()
+        for codec in decoders:
+            try:
+                payloads[os.path.basename(path)] = (KIND_CACHE, codec.decode(raw)[1])
+                break
+            except CacheCodecError:
+                continue
+        else:
+            try:
+                payloads[os.path.basename(path)] = (KIND_RAW, json.loads(raw))
+            except ValueError:
+                logger.warning(f"読めないファイルをスキップします: {path}")
+    return payloads
+
+def generate_player_payload(seed: int = 0) -> dict:
+    """/v3/player/<name>?fullResult に近い形（キャラクター毎の統計・クエスト一覧など）の合成データ"""
+    rng = random.Random(seed)
+    quests = [f"Quest Number {i} - {''.join(rng.choice('abcdefghijklmnop') for _ in range(8))}" for i in range(260)]
+    characters = {}
+    for i in range(14):
+        characters[f"{rng.getrandbits(128):032x}"] = {
+            "type": rng.choice(["WARRIOR", "MAGE", "ARCHER", "ASSASSIN", "SHAMAN"]),
+            "nickname": None,
+            "level": rng.randint(1, 106),
+            "xp": rng.randint(0, 10**9),
+            "xpPercent": rng.randint(0, 100),
+            "totalLevel": rng.randint(100, 1700),
+            "wars": rng.randint(0, 3000),
+            "playtime": round(rng.uniform(0, 3000), 2),
+            "mobsKilled": rng.randint(0, 10**6),
+            "chestsFound": rng.randint(0, 10**4),
+            "itemsIdentified": rng.randint(0, 10**4),
+            "blocksWalked": rng.randint(0, 10**8),
+            "logins": rng.randint(0, 10**4),
+            "deaths": rng.randint(0, 10**4),
+            "discoveries": rng.randint(0, 1000),
+            "gamemode": rng.sample(["hardcore", "ironman", "craftsman", "hunted"], rng.randint(0, 2)),
+            "skillPoints": {k: rng.randint(0, 150) for k in ("strength", "dexterity", "intelligence", "defence", "agility")},
+            "professions": {k: {"level": rng.randint(1, 132), "xpPercent": rng.randint(0, 100)} for k in (
+                "fishing", "woodcutting", "mining", "farming", "scribing", "jeweling",
+                "alchemism", "cooking", "weaponsmithing", "tailoring", "woodworking", "armouring")},
+            "dungeons": {"total": rng.randint(0, 500), "list": {f"Dungeon {d}": rng.randint(0, 100) for d in range(18)}},
+            "raids": {"total": rng.randint(0, 500), "list": {f"Raid {r}": rng.randint(0, 200) for r in range(4)}},
+            "quests": rng.sample(quests, rng.randint(0, len(quests))),
+        }
+    return {
+        "username": "SyntheticPlayer", "online": False, "server": None,
+        "uuid": f"{rng.getrandbits(128):032x}", "rank": "Player", "supportRank": "vipplus",
+        "firstJoin": "2016-05-01T12:00:00.000Z", "lastJoin": "2025-01-01T12:00:00.000Z", "playtime": 4321.5,
+        "guild": {"name": "Synthetic Guild", "prefix": "SYN", "rank": "CHIEF", "rankStars": "****"},
+        "globalData": {"wars": 1234, "totalLevel": 5000, "killedMobs": 123456, "chestsFound": 9999,
+                       "dungeons": {"total": 300, "list": {}}, "raids": {"total": 200, "list": {}}, "completedQuests": 800, "pvp": {"kills": 10, "deaths": 20}},
+        "ranking": {f"ranking_{i}": rng.randint(1, 100000) for i in range(120)},
+        "characters": characters,
+    }
+
+def measure(codec, data, iterations: int) -> dict:
+    timestamp = datetime.now()
+    encode_times, decode_times = [], []
+    payload = b""
+    for _ in range(iterations):
+        start = time.perf_counter()
+        payload = codec.encode(timestamp, data)
+        encode_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        codec.decode(payload)
+        decode_times.append(time.perf_counter() - start)
+    return {
+        "bytes": len(payload),
+        "encode_ms": round(statistics.median(encode_times) * 1000, 3),
+        "decode_ms": round(statistics.median(decode_times) * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="キャッシュのシリアライズ形式のベンチマーク")
+    parser.add_argument("paths", nargs="*", help="計測に使う取得済みの応答（省略時は合成データ）")
+    parser.add_argument("--from-cache", action="store_true", help="cache/ 以下のファイル（描画用の射影）で計測する")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", help="結果JSONの出力先（省略時は標準出力）")
+    args = parser.parse_args()
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='[{asctime}] [{levelname:<8}] {name}: {message}', style='{')
+
+    paths = list(args.paths)
+    if args.from_cache:
+        paths += sorted(glob.glob(os.path.join(CACHE_DIR, "*.json")) + glob.glob(os.path.join(CACHE_DIR, "*.bin")))
+    payloads = load_payloads(paths)
+    if not payloads:
+        logger.info("取得済みの応答が指定されていないため、合成したプレイヤーデータ(fullResult相当)で計測します")
+        payloads = {"synthetic_player": (KIND_SYNTHETIC, generate_player_payload())}
+
+    results = {"payloads": {}, "totals": {}}
+    for name, (kind, data) in payloads.items():
+        codecs = {codec.name: measure(codec, data, args.iterations) for codec in CODECS}
+        results["payloads"][name] = {"kind": kind, "codecs": codecs}
+        logger.info(f"{name} ({kind}): " + ", ".join(f"{c}={r['bytes'] / 1024:.0f}KB" for c, r in codecs.items()))
+    results["kinds"] = sorted({kind for kind, _ in payloads.values()})
+    for codec in CODECS:
+        rows = [r["codecs"][codec.name] for r in results["payloads"].values()]
+        results["totals"][codec.name] = {
+            "bytes": sum(r["bytes"] for r in rows),
+            "encode_ms": round(sum(r["encode_ms"] for r in rows), 3),
+            "decode_ms": round(sum(r["decode_ms"] for r in rows), 3),
+        }
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+マップ描画のベンチマーク。
+
+合成した領地データ（多数のギルド・クラスタ状の所有・acquired時刻付き）で
+MapRendererの全体マップ／ギルドズーム／単一領地の描画を計測し、
+壁時計時間・ピークRSS・PNGサイズをJSONで出力する。
+
+    python benchmarks/bench_map_render.py --iterations 5 --output bench_map.json
+"""
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import json
+import logging
+import random
+import resource
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone, timedelta
+
+import psutil
+
+from lib.map_renderer import MapRenderer
+
+logger = logging.getLogger(__name__)
+
+def generate_territory_data(store, guild_count: int = 60, unowned_ratio: float = 0.03, seed: int = 0) -> tuple[dict, dict]:
+    """
+    領地ストア(TerritoryStore)を元に /v3/guild/list/territory 形式の合成データとギルドカラーを作る。
+    ギルドの領地数は裾の重い分布にし、交易路に沿って隣接領地を塊で取らせる。
+    """
+    rng = random.Random(seed)
+    names = list(store.names)
+    guilds = []
+    for i in range(guild_count):
+        prefix = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz") for _ in range(rng.choice((3, 4))))
+        guilds.append({"uuid": f"00000000-0000-0000-0000-{i:012d}", "name": f"Synthetic Guild {i}", "prefix": f"{prefix}{i}"[:4]})
+    guild_color_map = {g["prefix"]: "#%06X" % rng.randrange(1 << 24) for g in guilds}
+
+    # 上位ギルドほど多く持つ (Zipf風)
+    weights = [1.0 / (rank + 1) ** 1.1 for rank in range(guild_count)]
+    total_weight = sum(weights)
+    owned_total = int(len(names) * (1 - unowned_ratio))
+    quotas = [max(1, int(owned_total * w / total_weight)) for w in weights]
+
+    owner = {}
+    unassigned = set(names)
+    for guild, quota in zip(guilds, quotas):
+        if not unassigned:
+            break
+        frontier = deque([rng.choice(sorted(unassigned))])
+        taken = 0
+        while frontier and taken < quota:
+            name = frontier.popleft()
+            if name not in unassigned:
+                continue
+            unassigned.discard(name)
+            owner[name] = guild
+            taken += 1
+            neighbours = [n for n in store.routes_of(name) if n in unassigned]
+            rng.shuffle(neighbours)
+            frontier.extend(neighbours)
+            if not frontier and taken < quota and unassigned:
+                frontier.append(rng.choice(sorted(unassigned)))
+
+    now = datetime.now(timezone.utc)
+    territory_data = {}
+    for name in names:
+        loc = store.location(name)
+        acquired = now - timedelta(seconds=rng.randrange(60, 14 * 24 * 3600))
+        entry = {
+            "guild": dict(owner[name]) if name in owner else {"uuid": None, "name": None, "prefix": None},
+            "acquired": acquired.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "location": {"start": list(loc["start"]), "end": list(loc["end"])},
+        }
+        territory_data[name] = entry
+    return territory_data, guild_color_map
+
+def reassign_owners(territory_data: dict, count: int, rng: random.Random) -> dict:
+    """count個の領地の所有者を別の既存ギルドへ付け替えたコピーを返す（戦争による変化の模擬）"""
+    data = {name: dict(info) for name, info in territory_data.items()}
+    owners = [info["guild"] for info in territory_data.values() if info["guild"].get("prefix")]
+    for name in rng.sample(list(data), min(count, len(data))):
+        data[name]["guild"] = dict(rng.choice(owners))
+        data[name]["acquired"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return data
+
+class PeakRssSampler:
+    """計測区間中のRSSを別スレッドでサンプリングしてピーク値を取る"""
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._process.memory_info().rss)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+def _read_map_file(file) -> bytes:
+    file.fp.seek(0)
+    data = file.fp.read()
+    file.close()
+    return data
+
+def run_case(name: str, iterations: int, render) -> dict:
+    """render(i) -> PNGバイト列 を繰り返し計測する"""
+    times, sizes, peaks = [], [], []
+    for i in range(iterations):
+        with PeakRssSampler() as sampler:
+            start = time.perf_counter()
+            png = render(i)
+            elapsed = time.perf_counter() - start
+        if not png:
+            raise RuntimeError(f"{name}: 描画結果が空です")
+        times.append(elapsed)
+        sizes.append(len(png))
+        peaks.append(sampler.peak)
+    result = {
+        "case": name,
+        "iterations": iterations,
+        "wall_time_s": {
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+            "max": max(times),
+        },
+        "peak_rss_mb": max(peaks) / (1024 * 1024),
+        "png_bytes": {"min": min(sizes), "max": max(sizes)},
+    }
+    logger.info(f"[MapBench] {name}: median {result['wall_time_s']['median'] * 1000:.1f}ms, peak RSS {result['peak_rss_mb']:.1f}MB, PNG {max(sizes):,}B")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="MapRendererの描画ベンチマーク")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--guilds", type=int, default=60, help="合成データのギルド数")
+    parser.add_argument("--changes", type=int, default=6, help="差分描画ケースで1回あたりに所有者が変わる領地数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果JSONの出力先（省略時は標準出力）")
+    args = parser.parse_args()
+    # 結果JSONを標準出力に出せるよう、ログは標準エラーへ
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='[{asctime}] [{levelname:<8}] {name}: {message}', style='{')
+
+    rng = random.Random(args.seed)
+    renderer = MapRenderer()
+    territory_data, guild_color_map = generate_territory_data(renderer.store, guild_count=args.guilds, seed=args.seed)
+
+    by_guild = {}
+    for name, info in territory_data.items():
+        prefix = info["guild"].get("prefix")
+        if prefix:
+            by_guild.setdefault(prefix, []).append(name)
+    ranked = sorted(by_guild, key=lambda p: len(by_guild[p]), reverse=True)
+    large_guild = ranked[0]
+    small_guild = next((p for p in reversed(ranked) if len(by_guild[p]) >= 2), ranked[-1])
+    territory_names = list(territory_data)
+
+    def guild_render(prefix):
+        subset = {name: territory_data[name] for name in by_guild[prefix]}
+        return lambda i: _read_map_file(renderer.create_territory_map(territory_data, subset, guild_color_map, show_held_time=True)[0])
+
+    def cold_full(i):
+        return _read_map_file(MapRenderer().create_territory_map(territory_data, territory_data, guild_color_map)[0])
+
+    def full_redraw(i):
+        # 毎回ほぼ全領地の所有者を入れ替え、差分描画が効かない状態で計測する
+        data = reassign_owners(territory_data, len(territory_data), rng)
+        return _read_map_file(renderer.create_territory_map(data, data, guild_color_map)[0])
+
+    incremental_base = {"data": territory_data}
+    def incremental(i):
+        incremental_base["data"] = reassign_owners(incremental_base["data"], args.changes, rng)
+        data = incremental_base["data"]
+        return _read_map_file(renderer.create_territory_map(data, data, guild_color_map)[0])
+
+    def single(i):
+        name = territory_names[rng.randrange(len(territory_names))]
+        buf = renderer.create_single_territory_image(name, territory_data, guild_color_map)
+        return buf.getvalue() if buf else None
+
+    # 差分描画ケースの初回は基準スナップショットを作るため計測前に1回描いておく
+    cases = [
+        ("full_map_cold", cold_full),
+        ("full_map_full_redraw", full_redraw),
+        ("full_map_incremental", None),
+        (f"guild_zoom_small[{small_guild}:{len(by_guild[small_guild])}]", guild_render(small_guild)),
+        (f"guild_zoom_large[{large_guild}:{len(by_guild[large_guild])}]", guild_render(large_guild)),
+        ("single_territory", single),
+    ]
+    results = []
+    for name, render in cases:
+        if name == "full_map_incremental":
+            renderer.create_territory_map(territory_data, territory_data, guild_color_map)
+            render = incremental
+        results.append(run_case(name, args.iterations, render))
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "params": vars(args),
+        "territories": len(territory_data),
+        "guilds": len(by_guild),
+        "process_max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "cases": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        logger.info(f"[MapBench] 結果を {args.output} に保存しました")
+    else:
+        sys.stdout.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import asyncio
 import logging
+import re
 from io import BytesIO
 from urllib.parse import quote
 
@@ -9,55 +11,97 @@ from lib.api_stocker import WynncraftAPI
 from lib.cache_handler import CacheHandler
 from lib.banner_renderer import BannerRenderer
 from lib.guild_profile_renderer import create_guild_image
+from lib.guild_directory import get_guild_directory
+from lib.projections import GuildSummary
 from lib.utils import create_embed
 
 logger = logging.getLogger(__name__)
 
+async def guild_autocomplete(
+    interaction: discord.Interaction,
+    current: str,
+) -> list[app_commands.Choice[str]]:
+    return [
+        app_commands.Choice(name=f"{name} [{prefix}]" if prefix else name, value=name)
+        for name, prefix in get_guild_directory().search(current, limit=25)
+    ]
+
 class GuildImageCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.wynn_api = WynncraftAPI()
+        self.wynn_api = WynncraftAPI(session=bot.http_client.session)
         self.cache = CacheHandler()
         self.banner_renderer = BannerRenderer()
         self.system_name = "Wynncraft Guild's Stats"
+        self._directory_task = None
         logger.info("--- [CommandsCog] ギルドコマンドCogが読み込まれました。")
 
-    def _safe_get(self, data, keys, default=None):
-        v = data
-        for k in keys:
-            if not isinstance(v, dict):
-                return default
-            v = v.get(k)
-            if v is None:
-                return default
-        return v if v is not None else default
+    async def cog_load(self):
+        # ギルド一覧が未取得なら裏で取っておく（定期更新はSeasonalRatingSyncが行う）
+        directory = get_guild_directory()
+        if not len(directory):
+            self._directory_task = asyncio.create_task(directory.refresh(self.wynn_api))
+
+    def cog_unload(self):
+        if self._directory_task and not self._directory_task.done():
+            self._directory_task.cancel()
+
+    def _guild_cache_key(self, name: str, uuid: str | None) -> str:
+        # 名前・prefixのどちらで引いても同じキャッシュに当たるよう、uuid（なければ小文字の名前）で揃える
+        return f"guild_{uuid or name.casefold()}"
+
+    async def _project(self, request) -> dict | None:
+        """APIの応答をギルドカードに使う項目だけに絞る（キャッシュにはこの形で保存する）"""
+        raw = await request
+        if not raw or not raw.get("name"):
+            return None
+        return GuildSummary.from_api(raw).to_dict()
+
+    async def _fetch_guild(self, guild: str) -> GuildSummary | None:
+        """ローカルのギルド一覧で名前/prefixを解決し、一覧にあるギルドはAPIへの問い合わせを1回以内に抑えて取得する"""
+        directory = get_guild_directory()
+        resolved = directory.resolve(guild)
+        if resolved:
+            name, _, uuid = resolved
+            # 期限切れでも許容時間内ならキャッシュをすぐ返し、取り直しは裏で行う
+            data = await self.cache.get_or_fetch(
+                self._guild_cache_key(name, uuid),
+                lambda: self._project(self.wynn_api.get_guild_by_name(name))
+            )
+        else:
+            # 一覧にない（作成直後・一覧の取得前など）ギルドは、形からprefixらしいか名前らしいかで
+            # 先に問い合わせるエンドポイントを選び、見つからなければもう一方も試す。
+            # 結果は入力した文字列のキーにも保存し、一覧に載るまでの再検索もキャッシュから返す
+            query = guild.strip()
+            lookups = [self.wynn_api.get_guild_by_prefix, self.wynn_api.get_guild_by_name]
+            if not re.fullmatch(r"[A-Za-z]{3,4}", query):
+                lookups.reverse()
+
+            async def fetch_unlisted() -> dict | None:
+                for lookup in lookups:
+                    found = await self._project(lookup(query))
+                    if found:
+                        self.cache.set_cache(self._guild_cache_key(found["name"], found.get("uuid")), found)
+                        return found
+                return None
+
+            data = await self.cache.get_or_fetch(self._guild_cache_key(query, None), fetch_unlisted)
+
+        if not data:
+            return None
+        directory.remember(data)
+        return GuildSummary.from_dict(data)
 
     @app_commands.allowed_installs(guilds=True, users=True)
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
     @app_commands.checks.cooldown(1, 5.0, key=lambda i: i.user.id)
     @app_commands.command(name="guild", description="ギルドのステータスカードを表示")
+    @app_commands.autocomplete(guild=guild_autocomplete)
     @app_commands.describe(guild="Name or Prefix")
     async def test(self, interaction: discord.Interaction, guild: str):
         await interaction.response.defer()
 
-        cache_key = f"guild_{guild}"
-        data_to_use = None
-
-        cached = self.cache.get_cache(cache_key)
-        if cached:
-            data_to_use = cached
-        else:
-            # 二段検索（prefix -> name）
-            data_as_prefix = await self.wynn_api.get_guild_by_prefix(guild)
-            if data_as_prefix and data_as_prefix.get("name"):
-                data_to_use = data_as_prefix
-            else:
-                data_as_name = await self.wynn_api.get_guild_by_name(guild)
-                if data_as_name and data_as_name.get("name"):
-                    data_to_use = data_as_name
-
-            if data_to_use:
-                self.cache.set_cache(cache_key, data_to_use)
+        data_to_use = await self._fetch_guild(guild)
 
         if not data_to_use:
             embed = create_embed(description=f"ギルド **{guild}** が見つかりませんでした。", title="🔴 エラーが発生しました", color=discord.Color.red(), footer_text=f"{self.system_name} | Onyx_")
@@ -66,11 +110,11 @@ class GuildImageCog(commands.Cog):
 
         # 画像生成
         try:
-            img_io: BytesIO = await create_guild_image(data_to_use, self.banner_renderer)
+            img_io: BytesIO = await create_guild_image(data_to_use, self.banner_renderer, self.wynn_api)
             file = discord.File(fp=img_io, filename="guild_card.png")
             
             # 公式サイトリンクのEmbed作成（シンプル版）
-            guild_name = self._safe_get(data_to_use, ["name"], "Unknown Guild")
+            guild_name = data_to_use.name
             encoded_name = quote(guild_name)
             url = f"https://wynncraft.com/stats/guild/{encoded_name}"
             
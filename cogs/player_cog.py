@@ -13,42 +13,21 @@ from config import SKIN_EMOJI_SERVER_ID
 from lib.cache_handler import CacheHandler
 from lib.banner_renderer import BannerRenderer
 from lib.profile_renderer import generate_profile_card
+from lib.projections import PlayerSummary
 
 logger = logging.getLogger(__name__)
 
-async def build_profile_info(data, wynn_api, banner_renderer):
-    """WynncraftAPIから得たplayer_dataからprofile_info辞書を生成"""
-    def safe_get(d, keys, default="???"):
-        v = d
-        for k in keys:
-            if not isinstance(v, dict):
-                return default
-            v = v.get(k)
-            if v is None:
-                return default
-        return v
+async def build_profile_info(player: PlayerSummary, wynn_api, banner_renderer):
+    """PlayerSummary（プレイヤーデータから抜き出した項目）からprofile_info辞書を生成"""
+    def or_default(v, default="???"):
+        return default if v is None else v
 
-    def fallback_stat(data, keys_global, default="???"):
-        val = safe_get(data, keys_global, None)
-        if val is not None:
-            return val
-        return default
-
-    def get_raid_stat(data, raid_key):
-        global_data = data.get("globalData")
-        if not global_data or not isinstance(global_data, dict):
-            return "???"
-        raids = global_data.get("raids")
-        if not raids or not isinstance(raids, dict):
+    def get_raid_stat(raid_key):
+        if player.raid_completions is None:
             return "???"
-        raid_list = raids.get("list")
-        if raid_list == {}:
-            return 0
-        if not raid_list or not isinstance(raid_list, dict):
-            return "???"
-        return raid_list.get(raid_key, 0)
+        return player.raid_completions.get(raid_key, 0)
 
-    raw_support_rank = safe_get(data, ['supportRank'], "None")
+    raw_support_rank = or_default(player.support_rank, "None")
     if raw_support_rank and raw_support_rank.lower() == "vipplus":
         support_rank_display = "Vip+"
     elif raw_support_rank and raw_support_rank.lower() == "heroplus":
@@ -56,10 +35,10 @@ async def build_profile_info(data, wynn_api, banner_renderer):
     else:
         support_rank_display = (raw_support_rank or 'None').capitalize()
 
-    first_join_str = safe_get(data, ['firstJoin'], "???")
+    first_join_str = or_default(player.first_join)
     first_join_date = first_join_str.split('T')[0] if first_join_str and 'T' in first_join_str else first_join_str
 
-    last_join_str = safe_get(data, ['lastJoin'], "???")
+    last_join_str = or_default(player.last_join)
     if last_join_str and isinstance(last_join_str, str) and 'T' in last_join_str:
         try:
             last_join_dt = datetime.fromisoformat(last_join_str.replace('Z', '+00:00'))
@@ -69,62 +48,54 @@ async def build_profile_info(data, wynn_api, banner_renderer):
     else:
         last_join_date = last_join_str if last_join_str else "???"
 
-    guild_prefix = safe_get(data, ['guild', 'prefix'], "")
-    guild_name = safe_get(data, ['guild', 'name'], "")
-    guild_rank = safe_get(data, ['guild', 'rank'], "")
+    guild_prefix = or_default(player.guild_prefix, "")
+    guild_name = or_default(player.guild_name, "")
+    guild_rank = or_default(player.guild_rank, "")
     guild_data = await wynn_api.get_guild_by_prefix(guild_prefix)
     banner_bytes = banner_renderer.create_banner_image(guild_data.get('banner') if guild_data and isinstance(guild_data, dict) else None)
 
-    is_online = safe_get(data, ['online'], False)
-    server = safe_get(data, ['server'], "???")
+    is_online = or_default(player.online, False)
+    server = or_default(player.server)
     if is_online:
         server_display = f"Online on {server}"
     else:
         server_display = "Offline"
 
-    active_char_uuid = safe_get(data, ['activeCharacter'])
-    if active_char_uuid is None:
+    if not player.has_active_character:
         active_char_info = "???"
+    elif player.character_reskin is not None:
+        active_char_info = f"{player.character_reskin}"
     else:
-        char_obj = safe_get(data, ['characters', active_char_uuid], {})
-        char_type = safe_get(char_obj, ['type'], "???")
-        reskin = safe_get(char_obj, ['reskin'], "N/A")
-        if reskin != "N/A":
-            active_char_info = f"{reskin}"
-        else:
-            active_char_info = f"{char_type}"
-
-    mobs_killed = fallback_stat(data, ['globalData', 'mobsKilled'])
-    playtime = data.get("playtime", "???") if data.get("playtime", None) is not None else "???"
-    wars = fallback_stat(data, ['globalData', 'wars'])
-    quests = fallback_stat(data, ['globalData', 'completedQuests'])
-    world_events = fallback_stat(data, ['globalData', 'worldEvents'])
-    total_level = fallback_stat(data, ['globalData', 'totalLevel'])
-    chests = fallback_stat(data, ['globalData', 'chestsFound'])
-    pvp_kill = str(safe_get(data, ['globalData', 'pvp', 'kills'], "???"))
-    pvp_death = str(safe_get(data, ['globalData', 'pvp', 'deaths'], "???"))
-    dungeons = fallback_stat(data, ['globalData', 'dungeons', 'total'])
-    all_raids = fallback_stat(data, ['globalData', 'raids', 'total'])
-
-    ranking_obj = safe_get(data, ['ranking'], None)
-    if ranking_obj is None:
+        active_char_info = f"{or_default(player.character_type)}"
+
+    mobs_killed = or_default(player.mobs_killed)
+    playtime = or_default(player.playtime)
+    wars = or_default(player.wars)
+    quests = or_default(player.completed_quests)
+    world_events = or_default(player.world_events)
+    total_level = or_default(player.total_level)
+    chests = or_default(player.chests_found)
+    pvp_kill = str(or_default(player.pvp_kills))
+    pvp_death = str(or_default(player.pvp_deaths))
+    dungeons = or_default(player.dungeons_total)
+    all_raids = or_default(player.raids_total)
+
+    if not player.has_ranking:
         war_rank_display = "非公開"
+    elif player.wars_completion_rank is None:
+        war_rank_display = "N/A"
     else:
-        war_rank_completion = ranking_obj.get('warsCompletion')
-        if war_rank_completion is None:
-            war_rank_display = "N/A"
-        else:
-            war_rank_display = str(war_rank_completion)
+        war_rank_display = str(player.wars_completion_rank)
 
-    notg = get_raid_stat(data, 'Nest of the Grootslangs')
-    nol = get_raid_stat(data, "Orphion's Nexus of Light")
-    tcc = get_raid_stat(data, 'The Canyon Colossus')
-    tna = get_raid_stat(data, 'The Nameless Anomaly')
+    notg = get_raid_stat('Nest of the Grootslangs')
+    nol = get_raid_stat("Orphion's Nexus of Light")
+    tcc = get_raid_stat('The Canyon Colossus')
+    tna = get_raid_stat('The Nameless Anomaly')
 
-    uuid = data.get("uuid")
+    uuid = player.uuid
 
     profile_info = {
-        "username": data.get("username"),
+        "username": player.username,
         "support_rank_display": support_rank_display,
         "guild_prefix": guild_prefix,
         "banner_bytes": banner_bytes,
@@ -260,14 +231,14 @@ class PlayerSelectView(discord.ui.View):
             await self.cleanup_emojis()
             return
         # 共通処理呼び出し
-        await self.cog_instance.handle_player_data(interaction, data, use_edit=True)
+        await self.cog_instance.handle_player_data(interaction, PlayerSummary.from_api(data), use_edit=True)
         await self.cleanup_emojis()
 
 class PlayerCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.wynn_api = WynncraftAPI()
-        self.other_api = OtherAPI()
+        self.wynn_api = WynncraftAPI(session=bot.http_client.session)
+        self.other_api = OtherAPI(session=bot.http_client.session)
         self.banner_renderer = BannerRenderer()
         self.cache = CacheHandler()
         self.system_name = "Wynncraft Player's Stats"
@@ -302,9 +273,9 @@ class PlayerCog(commands.Cog):
             return "???"
         return raid_list.get(raid_key, 0)
 
-    async def handle_player_data(self, interaction, data, use_edit=False):
+    async def handle_player_data(self, interaction, player: PlayerSummary, use_edit=False):
         from cogs.player_cog import build_profile_info  # 循環import回避用
-        profile_info = await build_profile_info(data, self.wynn_api, self.banner_renderer)
+        profile_info = await build_profile_info(player, self.wynn_api, self.banner_renderer)
 
         uuid = profile_info.get("uuid")
         skin_image = None
@@ -357,37 +328,41 @@ class PlayerCog(commands.Cog):
     async def player(self, interaction: discord.Interaction, player: str):
         await interaction.response.defer()
 
-        cache_key = f"player_{player.lower()}"
-        cached_data = self.cache.get_cache(cache_key)
-        if cached_data:
-            data = cached_data
-        else:
-            data = await self.wynn_api.get_official_player_data(player)
-            if not data or (isinstance(data, dict) and "error" in data and data.get("error") != "MultipleObjectsReturned"):
-                embed = create_embed(description=f"プレイヤー **{player}** が見つかりませんでした。", title="🔴 エラーが発生しました", color=discord.Color.red(), footer_text=f"{self.system_name} | Onyx_")
-                await interaction.followup.send(embed=embed)
-                return
-
-            if isinstance(data, dict) and data.get("error") == "MultipleObjectsReturned" and "objects" in data:
-                player_collision_dict = data["objects"]
-                view = PlayerSelectView(player_collision_dict=player_collision_dict, cog_instance=self, owner_id=interaction.user.id)
-                await view.prepare_options(self.bot)
-                if hasattr(view, "select_menu") and view.select_menu.options:
-                    embed = create_embed(description="どちらの情報を表示しますか?\n(Multiple Object Returned)", title="👀 複数のプレイヤーが見つかりました", color=discord.Color.purple(), footer_text=f"{self.system_name} | Onyx_")
-                    await interaction.followup.send(embed=embed, view=view)
-                else:
-                    embed = create_embed(description=f"プレイヤー **{player}** が見つかりませんでした。", title="🔴 エラーが発生しました", color=discord.Color.red(), footer_text=f"{self.system_name} | Onyx_")
-                    await interaction.followup.send(embed=embed)
-                return
-            if isinstance(data, dict) and 'username' in data:
-                self.cache.set_cache(cache_key, data)
+        async def fetch():
+            # fullResultの応答はカードに使う項目だけに絞ってからキャッシュする
+            raw = await self.wynn_api.get_official_player_data(player)
+            if isinstance(raw, dict) and 'username' in raw:
+                return PlayerSummary.from_api(raw).to_dict()
+            return raw
+
+        data = await self.cache.get_or_fetch(
+            f"player_{player.lower()}",
+            fetch,
+            should_cache=lambda d: isinstance(d, dict) and 'username' in d
+        )
+        if not data or (isinstance(data, dict) and "error" in data and data.get("error") != "MultipleObjectsReturned"):
+            embed = create_embed(description=f"プレイヤー **{player}** が見つかりませんでした。", title="🔴 エラーが発生しました", color=discord.Color.red(), footer_text=f"{self.system_name} | Onyx_")
+            await interaction.followup.send(embed=embed)
+            return
+
+        if isinstance(data, dict) and data.get("error") == "MultipleObjectsReturned" and "objects" in data:
+            player_collision_dict = data["objects"]
+            view = PlayerSelectView(player_collision_dict=player_collision_dict, cog_instance=self, owner_id=interaction.user.id)
+            await view.prepare_options(self.bot)
+            if hasattr(view, "select_menu") and view.select_menu.options:
+                embed = create_embed(description="どちらの情報を表示しますか?\n(Multiple Object Returned)", title="👀 複数のプレイヤーが見つかりました", color=discord.Color.purple(), footer_text=f"{self.system_name} | Onyx_")
+                await interaction.followup.send(embed=embed, view=view)
             else:
                 embed = create_embed(description=f"プレイヤー **{player}** が見つかりませんでした。", title="🔴 エラーが発生しました", color=discord.Color.red(), footer_text=f"{self.system_name} | Onyx_")
                 await interaction.followup.send(embed=embed)
-                return
+            return
+        if not (isinstance(data, dict) and 'username' in data):
+            embed = create_embed(description=f"プレイヤー **{player}** が見つかりませんでした。", title="🔴 エラーが発生しました", color=discord.Color.red(), footer_text=f"{self.system_name} | Onyx_")
+            await interaction.followup.send(embed=embed)
+            return
 
         # 共通処理呼び出し
-        await self.handle_player_data(interaction, data, use_edit=False)
+        await self.handle_player_data(interaction, PlayerSummary.from_dict(data), use_edit=False)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(PlayerCog(bot))
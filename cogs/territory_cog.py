@@ -1,54 +1,53 @@
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
+import asyncio
 import logging
-import json
-import os
 import re
-from datetime import datetime, timezone
-import subprocess
-import pickle
-import tempfile
-import sys
+from datetime import datetime, timezone, timedelta
 from io import BytesIO
 
 from lib.api_stocker import WynncraftAPI, OtherAPI
 from lib.map_renderer import MapRenderer
+from lib.territory_store import get_territory_store
+from lib.guild_directory import get_guild_directory
+from lib.map_worker_pool import MapWorkerPool
+from lib.single_flight import SingleFlight
 from lib.cache_handler import CacheHandler
 from lib.utils import create_embed
-from config import RESOURCE_EMOJIS
+from config import RESOURCE_EMOJIS, MAP_WORKER_POOL_SIZE, MAP_RENDER_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
-project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-TERRITORIES_JSON_PATH = os.path.join(project_root, "assets", "map", "territories.json")
-
 async def territory_autocomplete(
     interaction: discord.Interaction,
     current: str,
 ) -> list[app_commands.Choice[str]]:
     try:
-        with open(TERRITORIES_JSON_PATH, "r", encoding='utf-8') as f:
-            territory_names = list(json.load(f).keys())
+        territory_names = get_territory_store().search_index().search(current, limit=25)
     except Exception:
         territory_names = []
-    return [
-        app_commands.Choice(name=name, value=name)
-        for name in territory_names if current.lower() in name.lower()
-    ][:25]
+    return [app_commands.Choice(name=name, value=name) for name in territory_names]
 
 @app_commands.allowed_installs(guilds=True, users=True)
 @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 class Territory(commands.GroupCog, name="territory"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.wynn_api = WynncraftAPI()
-        self.other_api = OtherAPI()
+        self.wynn_api = WynncraftAPI(session=bot.http_client.session)
+        self.other_api = OtherAPI(session=bot.http_client.session)
+        self.territory_store = get_territory_store()  # MapRenderer・オートコンプリートと共有
+        self.territory_store.search_index()  # 最初の入力を待たせないよう先に作っておく
         self.map_renderer = MapRenderer()
+        self.map_pool = MapWorkerPool(size=MAP_WORKER_POOL_SIZE, default_timeout=MAP_RENDER_TIMEOUT)
+        self.render_flights = SingleFlight("MapRender")  # 同一内容の同時描画を1回にまとめる
         self.cache = CacheHandler()
         self.system_name = "Territory Map"
         self.territory_guilds_cache = [] # ギルド名のリスト
         self.latest_territory_data = {}  # 最新の領地データを保存
+        self.prerendered_map = None  # 最新データで先行描画した全体マップ
+        self._last_guild_color_map = None  # 直近に取得できたギルドカラー
+        self._prerender_task = None
         
         # 定期更新タスクを開始
         self.update_territory_data.start()
@@ -56,14 +55,7 @@ class Territory(commands.GroupCog, name="territory"):
         
         logger.info(f"--- [Cog] {self.__class__.__name__} が読み込まれました。")
 
-        try:
-            with open(TERRITORIES_JSON_PATH, "r", encoding='utf-8') as f:
-                self.territory_names = list(json.load(f).keys())
-        except Exception as e:
-            self.territory_names = []
-            logger.error(f"territories.jsonの読み込みに失敗: {e}")
-
-    def _create_status_embed(self, interaction: discord.Interaction, territory: str, target_territory_live_data: dict, static_data: dict) -> discord.Embed:
+    def _create_status_embed(self, interaction: discord.Interaction, territory: str, target_territory_live_data: dict) -> discord.Embed:
         acquired_dt = datetime.fromisoformat(target_territory_live_data['acquired'].replace("Z", "+00:00"))
         duration = datetime.now(timezone.utc) - acquired_dt
         days = duration.days
@@ -77,7 +69,7 @@ class Territory(commands.GroupCog, name="territory"):
         if minutes > 0:
             held_for_parts.append(f"{minutes} mins")
         held_for = " ".join(held_for_parts) if held_for_parts else "Just now"
-        production_data = static_data.get('resources', {})
+        production_data = self.territory_store.resources_of(territory)
         production_text_list = []
         for res_name, amount in production_data.items():
             if int(amount) > 0:
@@ -87,7 +79,7 @@ class Territory(commands.GroupCog, name="territory"):
                     display_res_name = display_res_name[:-1]
                 production_text_list.append(f"{emoji} {display_res_name}: `+{amount}/h`")
         production_text = "\n".join(production_text_list) if production_text_list else "None"
-        conns_count = len(static_data.get('Trading Routes', []))
+        conns_count = self.territory_store.route_count(territory)
         embed = discord.Embed(title=f"{territory}", color=discord.Color.purple())
         guild_name = target_territory_live_data['guild']['name']
         guild_prefix = target_territory_live_data['guild']['prefix']
@@ -98,9 +90,21 @@ class Territory(commands.GroupCog, name="territory"):
         embed.set_footer(text="Territory Status | Onyx_")
         return embed
 
-    def cog_unload(self):
+    async def cog_load(self):
+        await self.map_pool.start()
+
+    async def cog_unload(self):
         self.update_territory_data.cancel()
         self.update_territory_cache.cancel()
+        if self._prerender_task and not self._prerender_task.done():
+            self._prerender_task.cancel()
+        await self.map_pool.close()
+
+    def _render_timeout(self, interaction: discord.Interaction) -> float:
+        """インタラクションの有効期限（15分）を超えない描画タイムアウトを返す"""
+        expires_at = interaction.created_at + timedelta(minutes=15)
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        return max(1.0, min(MAP_RENDER_TIMEOUT, remaining))
 
     def safe_filename(self, name: str) -> str:
         return re.sub(r'[^a-zA-Z0-9_-]', '_', name)
@@ -118,6 +122,38 @@ class Territory(commands.GroupCog, name="territory"):
         self.latest_territory_data = territory_data
         logger.info(f"[TerritoryTracker] ✅ 領地データ更新完了: {len(territory_data)}個の領地")
 
+        # 取得直後に全体マップを裏で描画しておき、/territory map (ギルド指定なし) に即応答する
+        if self._prerender_task is None or self._prerender_task.done():
+            self._prerender_task = asyncio.create_task(self._prerender_full_map(territory_data))
+
+    async def _prerender_full_map(self, territory_data: dict):
+        """最新の領地データで全体マップと統計Embedを先行生成する"""
+        try:
+            guild_color_map = await self.get_guild_color_map_with_cache()
+            if not guild_color_map:
+                logger.warning("[TerritoryTracker] ギルドカラー取得失敗のため先行描画をスキップ")
+                return
+            snapshot = self.map_pool.snapshot_for(territory_data, guild_color_map)
+            if self.prerendered_map and self.prerendered_map['version'] == snapshot.version:
+                # 領地データ・カラーとも前回の先行描画から変わっていなければ描き直さない
+                return
+            params = {
+                'territory_names': None,
+                'show_held_time': False
+            }
+            flight_key = ('map', snapshot.version, None, False)
+            result = await self.render_flights.do(flight_key, lambda: self.map_pool.render(params, snapshot=snapshot))
+            if not result.get('map_bytes') or not result.get('embed_dict'):
+                logger.warning("[TerritoryTracker] 全体マップの先行描画に失敗しました")
+                return
+            result = dict(result)
+            result['version'] = snapshot.version
+            result['stats_embed'] = self.map_renderer.create_territory_stats_embed(territory_data)
+            self.prerendered_map = result
+            logger.info("[TerritoryTracker] ✅ 全体マップを先行描画しました")
+        except Exception as e:
+            logger.error(f"[TerritoryTracker] 全体マップ先行描画中にエラー: {e}", exc_info=True)
+
     @update_territory_data.before_loop
     async def before_territory_data_update(self):
         await self.bot.wait_until_ready()
@@ -148,11 +184,21 @@ class Territory(commands.GroupCog, name="territory"):
         interaction: discord.Interaction,
         current: str,
     ) -> list[app_commands.Choice[str]]:
-        result = [
-            app_commands.Choice(name=name, value=name)
-            for name in self.territory_guilds_cache if current.lower() in name.lower()
-        ][:25]
-        return result
+        # 全ギルド一覧からギルド名・prefixで検索し、領地を持つギルドだけを候補にする
+        holders = set(self.territory_guilds_cache)
+        result = []
+        seen = set()
+        for name, prefix in get_guild_directory().search(current, limit=25, accept=lambda name, prefix: prefix in holders):
+            if prefix not in seen:
+                seen.add(prefix)
+                result.append(app_commands.Choice(name=f"{prefix} ({name})", value=prefix))
+        # ディレクトリ未取得・未登録のギルドはprefixの部分一致で補う
+        result.extend(
+            app_commands.Choice(name=prefix, value=prefix)
+            for prefix in self.territory_guilds_cache
+            if prefix not in seen and current.lower() in prefix.lower()
+        )
+        return result[:25]
 
     async def get_territory_data_with_cache(self):
         # インスタンス変数の最新データを優先的に使用
@@ -160,23 +206,19 @@ class Territory(commands.GroupCog, name="territory"):
             return self.latest_territory_data
             
         # フォールバック：キャッシュから取得
-        cache_key = "wynn_territory_list"
-        territory_data = self.cache.get_cache(cache_key)
-        if not territory_data:
-            territory_data = await self.wynn_api.get_territory_list()
-            if territory_data:
-                self.cache.set_cache(cache_key, territory_data)
-                self.latest_territory_data = territory_data  # インスタンス変数にも保存
+        territory_data = await self.cache.get_or_fetch("wynn_territory_list", self.wynn_api.get_territory_list)
+        if territory_data:
+            self.latest_territory_data = territory_data  # インスタンス変数にも保存
         return territory_data
 
     async def get_guild_color_map_with_cache(self):
-        cache_key = "guild_color_map"
-        color_map = self.cache.get_cache(cache_key)
-        if not color_map:
-            color_map = await self.other_api.get_guild_color_map()
-            if color_map:
-                self.cache.set_cache(cache_key, color_map)
-        return color_map
+        # 色はほとんど変わらないので、古いキャッシュを返しつつ裏で取り直す
+        color_map = await self.cache.get_or_fetch("guild_color_map", self.other_api.get_guild_color_map)
+        if color_map:
+            self._last_guild_color_map = color_map
+            return color_map
+        # 取得できなければ直近のカラーを使う（カラー違いのスナップショットを作ってワーカーへ送り直さないように）
+        return self._last_guild_color_map
 
     @app_commands.checks.cooldown(1, 20.0)
     @app_commands.command(name="map", description="現在のWynncraftのテリトリーマップを生成")
@@ -206,34 +248,32 @@ class Territory(commands.GroupCog, name="territory"):
         else:
             territories_to_render = territory_data
 
-        params = {
-            'territory_data': territory_data,
-            'territories_to_render': territories_to_render,
-            'guild_color_map': guild_color_map,
-            'show_held_time': show_held_time
-        }
-        with tempfile.TemporaryFile() as inpipe, tempfile.TemporaryFile() as outpipe:
-            pickle.dump(params, inpipe)
-            inpipe.seek(0)
-            proc = subprocess.Popen(
-                [sys.executable, 'lib/subproc_map_worker.py'],
-                stdin=inpipe,
-                stdout=outpipe,
-                cwd=project_root
-            )
-            proc.wait()
-            outpipe.seek(0)
-            result = pickle.load(outpipe)
+        # 領地データ本体はスナップショットとして送り、描画対象は名前だけを渡す
+        snapshot = self.map_pool.snapshot_for(territory_data, guild_color_map)
+        prerendered = self.prerendered_map
+        if guild is None and prerendered and prerendered['version'] == snapshot.version:
+            # 同じ内容（スナップショットのversion）で先行描画済みならそのまま返す
+            result = prerendered
+        else:
+            params = {
+                'territory_names': list(territories_to_render) if guild else None,
+                'show_held_time': show_held_time
+            }
+            timeout = self._render_timeout(interaction)
+            flight_key = ('map', snapshot.version, guild.upper() if guild else None, show_held_time)
+            result = await self.render_flights.do(flight_key, lambda: self.map_pool.render(params, snapshot=snapshot, timeout=timeout))
 
         map_bytes = result.get('map_bytes')
         embed_dict = result.get('embed_dict')
         if map_bytes and embed_dict:
             file = discord.File(fp=BytesIO(map_bytes), filename="wynn_map.png")
             embed = discord.Embed.from_dict(embed_dict)
+            # 先行描画・まとめた描画の結果は使い回すので、フッターの時刻は送信時に付け直す
+            embed.set_footer(text=self.map_renderer.map_footer_text())
             
             # guildが指定されていない場合のみ統計Embedを作成・送信
             if guild is None:
-                stats_embed = self.map_renderer.create_territory_stats_embed(territory_data)
+                stats_embed = result.get('stats_embed') or self.map_renderer.create_territory_stats_embed(territory_data)
                 await interaction.followup.send(file=file, embeds=[embed, stats_embed])
                 del stats_embed
             else:
@@ -252,7 +292,6 @@ class Territory(commands.GroupCog, name="territory"):
     async def status(self, interaction: discord.Interaction, territory: str):
         await interaction.response.defer()
 
-        static_data = self.map_renderer.local_territories.get(territory)
         guild_color_map = await self.get_guild_color_map_with_cache()
         territory_data = await self.get_territory_data_with_cache()
         if not territory_data:
@@ -268,27 +307,17 @@ class Territory(commands.GroupCog, name="territory"):
             interaction,
             territory,
             target_territory_live_data,
-            static_data,
         )
 
+        # カラーが取れていなくても空のカラーで新しいversionを作らず、現在のスナップショットを使い回す
+        snapshot = self.map_pool.snapshot_for(territory_data, guild_color_map)
         params = {
             'mode': 'single',
             'territory': territory,
-            'territory_data': territory_data,
-            'guild_color_map': guild_color_map,
         }
-        with tempfile.TemporaryFile() as inpipe, tempfile.TemporaryFile() as outpipe:
-            pickle.dump(params, inpipe)
-            inpipe.seek(0)
-            proc = subprocess.Popen(
-                [sys.executable, 'lib/subproc_map_worker.py'],
-                stdin=inpipe,
-                stdout=outpipe,
-                cwd=project_root
-            )
-            proc.wait()
-            outpipe.seek(0)
-            result = pickle.load(outpipe)
+        timeout = self._render_timeout(interaction)
+        flight_key = ('single', snapshot.version, territory)
+        result = await self.render_flights.do(flight_key, lambda: self.map_pool.render(params, snapshot=snapshot, timeout=timeout))
 
         img_bytes = result.get('image_bytes')
         if img_bytes:
@@ -14,6 +14,15 @@ AUTHORIZED_USER_IDS = [
 # サーバーID（スキン頭絵文字用）
 SKIN_EMOJI_SERVER_ID = 1158535340110381157
 
+# マップ描画用の常駐ワーカープロセス数
+# 全体マップを描いたワーカーは1つ約100MBで常駐するため、マップ生成の予算(100MB)に収まる1つにしておく
+MAP_WORKER_POOL_SIZE = 1
+# マップ描画1件あたりのタイムアウト（秒）
+MAP_RENDER_TIMEOUT = 60.0
+
+# Wynncraft APIの1分あたりのリクエスト上限（応答のRateLimit-*ヘッダーで随時補正される）
+WYNNCRAFT_RATE_LIMIT = 120
+
 # テリトリーリソースと絵文字の対応表
 RESOURCE_EMOJIS = {
     "EMERALDS": "<:wynn_emerald:1395325625522458654>",
@@ -4,22 +4,64 @@ from urllib.parse import quote
 import logging
 from PIL import Image
 from io import BytesIO
-from config import WYNNCRAFT_API_TOKEN
+from config import WYNNCRAFT_API_TOKEN, WYNNCRAFT_RATE_LIMIT
+from lib.rate_limiter import RateLimiter, PRIORITY_INTERACTIVE, parse_retry_after
+from lib.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# 429で待つ時間の上限（1回あたり / 1リクエストの累計、秒）
+THROTTLE_WAIT_CAP = 60.0
+THROTTLE_TOTAL_CAP = 180.0
+# 1リクエストで429を受けてよい回数（Retry-After: 0 が続くと待ち時間の累計では止まらないため）
+THROTTLE_MAX_HITS = 10
+
 class WynncraftAPI:
-    def __init__(self):
+    # 同じAPIトークンを使う全インスタンスで共有する
+    rate_limiter = RateLimiter("Wynncraft", WYNNCRAFT_RATE_LIMIT, window=60.0)
+    # 同時に来た同一GETを1回の通信にまとめる（結果は共有されるので呼び出し側で書き換えないこと）
+    _flights = SingleFlight("WynncraftAPI")
+
+    def __init__(self, session: aiohttp.ClientSession | None = None, priority: int = PRIORITY_INTERACTIVE):
+        # レートリミッターでの優先度（定期クロールはPRIORITY_BACKGROUNDで作る）
+        self.priority = priority
         self.headers = {
             'User-Agent': 'DiscordBot/1.0',
             'Authorization': f'Bearer {WYNNCRAFT_API_TOKEN}',
         }
-        self.session = aiohttp.ClientSession(headers=self.headers)
+        # 共有セッション(HttpClient)を渡された場合はそれを使い、閉じるのは持ち主に任せる
+        self._owns_session = session is None
+        self.session = session or aiohttp.ClientSession()
 
     async def _make_request(self, url: str, *, return_bytes: bool = False, max_retries: int = 5, timeout: int = 10):
-        for i in range(max_retries):
+        # 優先度もキーに含め、ユーザーのリクエストがクロール側の待ち行列に巻き込まれないようにする
+        key = (url, return_bytes, self.priority)
+        return await self._flights.do(key, lambda: self._request(url, return_bytes=return_bytes, max_retries=max_retries, timeout=timeout))
+
+    async def _request(self, url: str, *, return_bytes: bool, max_retries: int, timeout: int):
+        i = 0
+        throttled = 0.0
+        throttle_hits = 0
+        while i < max_retries:
             try:
-                async with self.session.get(url, timeout=timeout) as response:
+                await self.rate_limiter.acquire(self.priority)
+                async with self.session.get(url, headers=self.headers, timeout=timeout) as response:
+                    self.rate_limiter.update_from_headers(response.headers)
+                    if response.status == 429:
+                        # 見つからない扱いにせず、指定された時間だけ全体を止めてから再開する（再試行回数には数えない）
+                        retry_after = parse_retry_after(response.headers)
+                        # Retry-After: 0 は「すぐ再試行してよい」なので、既定値を使うのはヘッダーがないときだけ
+                        wait = min(THROTTLE_WAIT_CAP, 5.0 if retry_after is None else retry_after)
+                        if throttled + wait > THROTTLE_TOTAL_CAP:
+                            logger.error(f"429による待機が累計{throttled:.0f}秒を超えたため中止します。URL: {url}")
+                            return None
+                        throttle_hits += 1
+                        if throttle_hits > THROTTLE_MAX_HITS:
+                            logger.error(f"429が{THROTTLE_MAX_HITS}回続いたため中止します。URL: {url}")
+                            return None
+                        throttled += wait
+                        self.rate_limiter.throttle(wait)
+                        continue
                     if 200 <= response.status < 301:
                         if return_bytes:
                             data = await response.read()
@@ -29,7 +71,7 @@ class WynncraftAPI:
                         if response.content_length != 0:
                             return await response.json()
                         return None
-                    non_retryable_codes = [400, 404, 429]
+                    non_retryable_codes = [400, 404]
                     if response.status in non_retryable_codes:
                         logger.warning(f"APIが{response.status}エラーを返しました。対象が見つかりません。URL: {url}")
                         return None
@@ -48,12 +90,14 @@ class WynncraftAPI:
                             except Exception as e:
                                 logger.warning(f"500エラーのレスポンスパース失敗: {e}")
                         logger.warning(f"APIがステータス{response.status}を返しました。再試行します... ({i+1}/{max_retries})")
+                        i += 1
                         await asyncio.sleep(2)
                         continue
                     logger.error(f"APIから予期せぬエラー: Status {response.status}, URL: {url}")
                     return None
             except Exception as e:
                 logger.error(f"リクエスト中に予期せぬエラー: {repr(e)}", exc_info=True)
+                i += 1
                 await asyncio.sleep(2)
         logger.error(f"最大再試行回数({max_retries}回)に達しました。URL: {url}")
         return None
@@ -79,11 +123,14 @@ class WynncraftAPI:
         return await self._make_request(url)
 
     async def close(self):
-        await self.session.close()
+        if self._owns_session:
+            await self.session.close()
 
 
 class OtherAPI:
-    def __init__(self):
+    _flights = SingleFlight("OtherAPI")
+
+    def __init__(self, session: aiohttp.ClientSession | None = None):
         self.guild_color_headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://athena.wynntils.com/'
@@ -96,18 +143,26 @@ class OtherAPI:
             'Cache-Control': 'no-cache',
             'Referer': 'https://vzge.me/'
         }
-        # コネクション最適化
-        connector = aiohttp.TCPConnector(
-            limit=20,  # 総接続数制限
-            limit_per_host=5,  # ホスト別接続数制限
-            ttl_dns_cache=300,  # DNS キャッシュ時間
-            use_dns_cache=True,  # DNS キャッシュ有効
-            keepalive_timeout=30,  # Keep-Alive タイムアウト
-            enable_cleanup_closed=True  # 閉じた接続のクリーンアップ
-        )
-        self.session = aiohttp.ClientSession(connector=connector)
+        self._owns_session = session is None
+        if session is None:
+            # コネクション最適化
+            connector = aiohttp.TCPConnector(
+                limit=20,  # 総接続数制限
+                limit_per_host=5,  # ホスト別接続数制限
+                ttl_dns_cache=300,  # DNS キャッシュ時間
+                use_dns_cache=True,  # DNS キャッシュ有効
+                keepalive_timeout=30,  # Keep-Alive タイムアウト
+                enable_cleanup_closed=True  # 閉じた接続のクリーンアップ
+            )
+            session = aiohttp.ClientSession(connector=connector)
+        self.session = session
 
     async def _make_request(self, url: str, *, headers=None, return_bytes: bool = False, max_retries: int = 5, timeout: int = 6):
+        # 同時に来た同一GETを1回の通信にまとめる（結果は共有されるので呼び出し側で書き換えないこと）
+        key = (url, return_bytes)
+        return await self._flights.do(key, lambda: self._request(url, headers=headers, return_bytes=return_bytes, max_retries=max_retries, timeout=timeout))
+
+    async def _request(self, url: str, *, headers, return_bytes: bool, max_retries: int, timeout: int):
         for i in range(max_retries):
             try:
                 # より短い個別タイムアウト設定
@@ -120,7 +175,14 @@ class OtherAPI:
                         if response.content_length != 0:
                             return await response.json()
                         return None
-                    if response.status in [400, 404, 429]:
+                    if response.status == 429:
+                        # 指定された時間（なければ指数バックオフ）だけ待って再試行
+                        retry_after = parse_retry_after(response.headers)
+                        wait_time = min(1.5 ** i if retry_after is None else retry_after, 10)
+                        logger.warning(f"APIが429。{wait_time:.1f}秒後に再試行 ({i+1}/{max_retries}) URL: {url}")
+                        await asyncio.sleep(wait_time)
+                        continue
+                    if response.status in [400, 404]:
                         logger.warning(f"APIが{response.status}エラーを返しました。URL: {url}")
                         return None
                     if response.status in [408, 500, 502, 503, 504]:
@@ -181,4 +243,5 @@ class OtherAPI:
             buf.close()
 
     async def close(self):
-        await self.session.close()
+        if self._owns_session:
+            await self.session.close()
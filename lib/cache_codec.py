@@ -0,0 +1,86 @@
+import json
+import marshal
+import struct
+import zlib
+from datetime import datetime
+
+
+class CacheCodecError(ValueError):
+    """キャッシュファイルを読めなかった（形式違い・壊れている等）"""
+
+
+class JsonCodec:
+    """従来どおりのJSON形式 {"timestamp": ISO文字列, "data": ...}。人が読める代わりに大きく遅い"""
+    name = "json"
+    suffix = ".json"
+
+    def encode(self, timestamp: datetime, data) -> bytes:
+        return json.dumps(
+            {'timestamp': timestamp.isoformat(), 'data': data},
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def decode(self, payload: bytes) -> tuple[datetime, object]:
+        try:
+            obj = json.loads(payload)
+            return datetime.fromisoformat(obj['timestamp']), obj.get('data')
+        except (KeyError, TypeError, ValueError) as e:
+            raise CacheCodecError(str(e)) from e
+
+    def raw_size(self, payload: bytes) -> int:
+        return len(payload)
+
+
+class MarshalCodec:
+    """
+    marshalによるバイナリ形式。APIのJSON由来のデータ（dict/list/str/数値/None）をそのまま高速に読み書きする。
+    compress_level を指定するとzlibで圧縮する（1なら速度をほぼ落とさずに数分の1になる）。
+    marshalの形式はPythonのバージョンで変わりうるため、読めないファイルはキャッシュミスとして扱う。
+    """
+    name = "marshal"
+    suffix = ".bin"
+    _MAGIC = b"WC1"
+    _RAW = b"R"
+    _ZLIB = b"Z"
+    _HEADER = struct.Struct("<3scI")  # (マジック, 圧縮の有無, 圧縮前のバイト数)
+
+    def __init__(self, compress_level: int | None = 1):
+        self.compress_level = compress_level
+        if compress_level is not None:
+            self.name = f"marshal+zlib{compress_level}"
+
+    def encode(self, timestamp: datetime, data) -> bytes:
+        body = marshal.dumps((timestamp.timestamp(), data))
+        if self.compress_level is None:
+            return self._HEADER.pack(self._MAGIC, self._RAW, len(body)) + body
+        return self._HEADER.pack(self._MAGIC, self._ZLIB, len(body)) + zlib.compress(body, self.compress_level)
+
+    def _unpack_header(self, payload: bytes) -> tuple[bytes, int]:
+        try:
+            magic, flag, raw_size = self._HEADER.unpack_from(payload)
+        except struct.error as e:
+            raise CacheCodecError(str(e)) from e
+        if magic != self._MAGIC:
+            raise CacheCodecError("未知のキャッシュ形式です")
+        return flag, raw_size
+
+    def decode(self, payload: bytes) -> tuple[datetime, object]:
+        flag, _ = self._unpack_header(payload)
+        try:
+            body = memoryview(payload)[self._HEADER.size:]
+            if flag == self._ZLIB:
+                body = zlib.decompress(body)
+            timestamp, data = marshal.loads(body)
+            return datetime.fromtimestamp(timestamp), data
+        except (EOFError, TypeError, ValueError, zlib.error) as e:
+            raise CacheCodecError(str(e)) from e
+
+    def raw_size(self, payload: bytes) -> int:
+        """圧縮前のバイト数（メモリ層の容量見積もりに使う）"""
+        return self._unpack_header(payload)[1]
+
+
+# キャッシュが既定で使う形式
+DEFAULT_CACHE_CODEC = MarshalCodec(compress_level=1)
+# 掃除の対象にするファイルの拡張子（形式を切り替えた後の古いファイルも期限で消えるように）
+CACHE_FILE_SUFFIXES = (JsonCodec.suffix, MarshalCodec.suffix)
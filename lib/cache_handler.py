@@ -1,66 +1,332 @@
 import os
-from datetime import datetime, timedelta
+import asyncio
 import logging
-from .utils import load_json_from_file, save_json_to_file
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+from .cache_codec import CACHE_FILE_SUFFIXES, DEFAULT_CACHE_CODEC, CacheCodecError
+from .single_flight import SingleFlight
+from .utils import atomic_write_bytes
 
 logger = logging.getLogger(__name__)
 
 CACHE_DIR = "cache"
 CACHE_EXPIRATION_MINUTES = 1
+# キー種別ごとの鮮度: (キーの接頭辞, 有効期限, 期限切れ後もget_or_fetchで返してよい時間)
+# guild_/player_ はオンライン状況やサーバーを含むので、期限切れ後に返すのは数分まで
+CACHE_POLICIES = (
+    ("wynn_territory_list", timedelta(minutes=1), timedelta(minutes=5)),
+    ("guild_color_map", timedelta(minutes=30), timedelta(days=1)),
+    ("guild_", timedelta(minutes=5), timedelta(minutes=2)),
+    ("player_", timedelta(minutes=2), timedelta(minutes=2)),
+)
+DEFAULT_CACHE_POLICY = (timedelta(minutes=CACHE_EXPIRATION_MINUTES), timedelta(0))
+# メモリ層の上限（全CacheHandlerで共有）
+CACHE_MEMORY_MAX_ENTRIES = 256
+# メモリ層は圧縮前のシリアライズ後のサイズで数える。Pythonオブジェクトとしては実測でその5〜9倍になるので、
+# 8MBでおおよそ40〜70MBに収まる
+CACHE_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+# ディスク側の合計サイズ上限（超えたら最後に使われたのが古い順に消す）
+CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+# 書き込み途中で残った一時ファイルを消すまでの時間（秒）
+CACHE_TMP_MAX_AGE = 600
+
+
+class _MemoryTier:
+    """プロセス内で全CacheHandlerが共有するLRU。件数と(圧縮前のシリアライズ表現での)バイト数で上限を設ける"""
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[datetime, object, int]] = OrderedDict()
+        self.bytes = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, timestamp: datetime, data, size: int):
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (timestamp, data, size)
+        self.bytes += size
+        self._evict()
+
+    def resize(self, key: str, timestamp: datetime, size: int | None):
+        """
+        put時にはサイズ未定だったエントリに、エンコード後のサイズを付ける（その後上書きされていれば何もしない）。
+        sizeがNone（エンコードできなかった）なら、上限で数えられないエントリを残さないよう外す。
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != timestamp:
+            return
+        if size is None or size > self.max_bytes:
+            self.pop(key)
+            return
+        self._entries[key] = (timestamp, entry[1], size)
+        self.bytes += size - entry[2]
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, _, old_size) = self._entries.popitem(last=False)
+            self.bytes -= old_size
+
+    def pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+
+_memory_tier = _MemoryTier(CACHE_MEMORY_MAX_ENTRIES, CACHE_MEMORY_MAX_BYTES)
+# ディスク書き込みはイベントループ外の1スレッドで順番に行う（同じキーの書き込みが前後しないように）
+_disk_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+# キャッシュファイルのパス -> 最後に読み書きした時刻（LRU判定用。ファイルのmtimeより新しいときだけ意味がある）
+_last_used: dict[str, float] = {}
+
+# 期限切れエントリの裏での取り直しは、キーごとに同時に1つだけ
+_refresh_flights = SingleFlight("CacheRefresh")
+_background_refreshes: set[asyncio.Task] = set()
+
+def cache_policy(key: str) -> tuple[timedelta, timedelta]:
+    """キーに対応する (有効期限, 期限切れ後に返してよい時間) を返す"""
+    for prefix, ttl, stale in CACHE_POLICIES:
+        if key.startswith(prefix):
+            return ttl, stale
+    return DEFAULT_CACHE_POLICY
+
+def _encode_and_write(codec, path: str, timestamp: datetime, data) -> int | None:
+    """エンコードしてファイルに書き、メモリ層で数えるサイズを返す（ディスク書き込み用のスレッドで呼ぶ）。エンコードに失敗したらNone"""
+    try:
+        payload = codec.encode(timestamp, data)
+    except Exception as e:
+        logger.error(f"キャッシュのエンコードに失敗 ({path}): {e}")
+        return None
+    _write_cache_file(path, payload)
+    return codec.raw_size(payload)
+
+def _write_cache_file(path: str, payload: bytes):
+    try:
+        atomic_write_bytes(path, payload)
+    except Exception as e:
+        logger.error(f"ファイル'{path}'への書き込みに失敗: {e}")
+
 
 class CacheHandler:
-    def __init__(self):
+    """
+    2層キャッシュ。よく使うキーはプロセス内のLRU(メモリ層)から返し、ファイルには触れない。
+    メモリ層にないキーだけディスク(cache/)から読み、読んだものはメモリ層に載せる。
+    ディスク上の形式は codec で差し替えられる（既定はzlib圧縮したmarshal。lib/cache_codec.py）。
+    有効期限はキーの種別ごと(CACHE_POLICIES)に決まる。
+    返すデータはメモリ層と共有なので、呼び出し側で書き換えないこと。
+    """
+    def __init__(self, codec=None):
+        self.codec = codec or DEFAULT_CACHE_CODEC
         if not os.path.exists(CACHE_DIR):
             os.makedirs(CACHE_DIR)
 
     def _get_cache_path(self, key: str) -> str:
         safe_key = key.replace("/", "_").replace("\\", "_")
-        return os.path.join(CACHE_DIR, f"{safe_key}.json")
+        return os.path.join(CACHE_DIR, f"{safe_key}{self.codec.suffix}")
 
-    def get_cache(self, key: str, ignore_freshness: bool = False) -> dict | list | None:
+    def _read_file(self, path: str) -> tuple[datetime, object, int] | None:
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"ファイル'{path}'の読み込みに失敗: {e}")
+            return None
+        try:
+            cache_time, data = self.codec.decode(payload)
+        except CacheCodecError as e:
+            logger.warning(f"キャッシュファイル'{path}'を読めませんでした: {e}")
+            return None
+        return cache_time, data, self.codec.raw_size(payload)
+
+    def _lookup_memory(self, key: str) -> tuple[datetime, Any] | None:
+        """メモリ層から (保存時刻, データ) を探す。期限切れ後の許容時間も過ぎたものは返さない"""
+        ttl, stale = cache_policy(key)
+        entry = _memory_tier.get(key)
+        if entry is not None:
+            cache_time, data, _ = entry
+            if datetime.now() - cache_time <= ttl + stale:
+                _last_used[self._get_cache_path(key)] = time.time()
+                return cache_time, data
+        return None
+
+    def _lookup(self, key: str) -> tuple[datetime, Any] | None:
+        """メモリ層→ディスクの順に (保存時刻, データ) を探す（ディスクはその場で読む）"""
+        found = self._lookup_memory(key)
+        if found is not None:
+            return found
+        path = self._get_cache_path(key)
+        return self._load_from_disk(key, path, self._read_file(path))
+
+    async def _lookup_async(self, key: str) -> tuple[datetime, Any] | None:
+        """_lookup と同じだが、ディスクの読み込みとデコードはディスク書き込み用のスレッドで行う"""
+        found = self._lookup_memory(key)
+        if found is not None:
+            return found
         path = self._get_cache_path(key)
-        cached_data = load_json_from_file(path)
-        if not cached_data:
+        cached = await asyncio.get_running_loop().run_in_executor(_disk_writer, self._read_file, path)
+        # 読んでいる間に set_cache された新しいデータがあればそちらを使う
+        found = self._lookup_memory(key)
+        if found is not None:
+            return found
+        return self._load_from_disk(key, path, cached)
+
+    def _load_from_disk(self, key: str, path: str, cached: tuple[datetime, object, int] | None) -> tuple[datetime, Any] | None:
+        """ディスクから読んだエントリをメモリ層に載せて返す。期限切れ後の許容時間も過ぎたものは捨てる"""
+        if cached is None:
+            return None
+        ttl, stale = cache_policy(key)
+        cache_time, data, size = cached
+        if datetime.now() - cache_time > ttl + stale:
+            # ファイルの削除は定期掃除(sweep_disk)に任せ、リクエスト中は消さない
+            logger.info(f"キャッシュ '{key}' は有効期限切れです。")
+            _memory_tier.pop(key)
             return None
-        if not ignore_freshness:
-            try:
-                cache_time = datetime.fromisoformat(cached_data['timestamp'])
-                if datetime.now() - cache_time > timedelta(minutes=CACHE_EXPIRATION_MINUTES):
-                    logger.info(f"キャッシュ '{key}' は有効期限切れです。")
-                    # 有効期限切れのファイルは削除
-                    try:
-                        os.remove(path)
-                        logger.info(f"期限切れキャッシュファイル {path} を削除しました。")
-                    except Exception:
-                        pass
-                    return None
-            except (KeyError, TypeError):
-                return None
+        _memory_tier.put(key, cache_time, data, size)
+        _last_used[path] = time.time()
         logger.info(f"キャッシュ '{key}' からデータを読み込みました。")
-        return cached_data.get('data')
+        return cache_time, data
+
+    def get_cache(self, key: str, ignore_freshness: bool = False) -> dict | list | None:
+        found = self._lookup(key)
+        if found is None:
+            return None
+        cache_time, data = found
+        if not ignore_freshness and datetime.now() - cache_time > cache_policy(key)[0]:
+            return None
+        return data
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        *,
+        should_cache: Callable[[Any], bool] | None = None
+    ) -> Any:
+        """
+        キャッシュがあれば返し、なければfetch()で取得して保存する（stale-while-revalidate）。
+        有効期限切れでも許容時間内ならそれをすぐ返し、裏で1回だけ取り直す。
+        should_cacheがFalseを返した取得結果は、保存せずにそのまま返す。
+        """
+        found = await self._lookup_async(key)
+        if found is not None:
+            cache_time, data = found
+            if datetime.now() - cache_time > cache_policy(key)[0] and not _refresh_flights.in_flight(key):
+                task = asyncio.create_task(_refresh_flights.do(key, lambda: self._fetch_and_store(key, fetch, should_cache)))
+                _background_refreshes.add(task)
+                task.add_done_callback(self._on_background_refresh_done)
+            return data
+        return await _refresh_flights.do(key, lambda: self._fetch_and_store(key, fetch, should_cache))
+
+    async def _fetch_and_store(self, key: str, fetch, should_cache) -> Any:
+        data = await fetch()
+        if data and (should_cache is None or should_cache(data)):
+            self.set_cache(key, data)
+        return data
+
+    @staticmethod
+    def _on_background_refresh_done(task: asyncio.Task):
+        _background_refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"キャッシュの裏での更新に失敗: {task.exception()}")
 
     def set_cache(self, key: str, data: dict | list):
         if not data: return
         path = self._get_cache_path(key)
-        payload = {'timestamp': datetime.now().isoformat(), 'data': data}
-        success = save_json_to_file(path, payload)
-        if success:
-            logger.info(f"'{key}' のデータをキャッシュに保存しました。")
-
-    def cleanup_expired_cache(self):
-        """ キャッシュディレクトリ内の期限切れファイルをすべて削除 """
-        now = datetime.now()
-        for fname in os.listdir(CACHE_DIR):
-            if not fname.endswith('.json'):
-                continue
-            fpath = os.path.join(CACHE_DIR, fname)
-            data = load_json_from_file(fpath)
-            if not data:
-                continue
-            try:
-                cache_time = datetime.fromisoformat(data['timestamp'])
-                if now - cache_time > timedelta(minutes=CACHE_EXPIRATION_MINUTES):
-                    os.remove(fpath)
-                    logger.info(f"期限切れキャッシュファイル {fpath} をクリーンアップで削除しました。")
-            except Exception:
-                continue
+        timestamp = datetime.now()
+        # すぐ読めるよう先にメモリ層へ載せ、エンコード（圧縮）と書き込みはイベントループ外で行う。
+        # サイズはエンコード後に分かるので、それまでは0で数える（エンコードに失敗したらメモリ層からも外す）
+        _memory_tier.put(key, timestamp, data, 0)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # イベントループ外（スクリプト等）からはその場で書く
+            _memory_tier.resize(key, timestamp, _encode_and_write(self.codec, path, timestamp, data))
+        else:
+            def on_written(future):
+                ok = not future.cancelled() and future.exception() is None
+                _memory_tier.resize(key, timestamp, future.result() if ok else None)
+            loop.run_in_executor(_disk_writer, _encode_and_write, self.codec, path, timestamp, data).add_done_callback(on_written)
+        logger.info(f"'{key}' のデータをキャッシュに保存しました。")
+
+    def sweep_disk(self, last_used: dict[str, float], max_bytes: int = CACHE_DISK_MAX_BYTES) -> tuple[dict, set[str]]:
+        """
+        キャッシュディレクトリを掃除する（定期タスクからイベントループ外で呼ぶ）。
+        ファイルは開かず、mtime（=保存時刻）とサイズだけで判断する。
+        期限切れ後の許容時間も過ぎたものを消し、それでも max_bytes を超えていれば
+        最後に使われたのが古い順に消す。
+        last_used はイベントループ側で取った _last_used のコピーで、共有のdictには触れない。
+        (計測値, 残ったファイルのパス) を返す。
+        """
+        now = time.time()
+        removed = evicted = 0
+        live: list[tuple[float, int, str]] = []  # (最後に使った時刻, サイズ, パス)
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    if now - st.st_mtime > CACHE_TMP_MAX_AGE:
+                        self._remove_file(entry.path)
+                    continue
+                key, suffix = os.path.splitext(entry.name)
+                if suffix not in CACHE_FILE_SUFFIXES:
+                    continue
+                ttl, stale = cache_policy(key)
+                if now - st.st_mtime > (ttl + stale).total_seconds():
+                    if self._remove_file(entry.path):
+                        removed += 1
+                    continue
+                live.append((max(st.st_mtime, last_used.get(entry.path, 0.0)), st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in live)
+        present = {path for _, _, path in live}
+        if total > max_bytes:
+            live.sort()
+            for _, size, path in live:
+                if total <= max_bytes:
+                    break
+                if self._remove_file(path):
+                    total -= size
+                    evicted += 1
+                    present.discard(path)
+
+        stats = {"removed": removed, "evicted": evicted, "files": len(present), "bytes": total}
+        logger.info(f"[CacheHandler] キャッシュを掃除しました: 期限切れ {removed}件 / 容量超過 {evicted}件を削除 (残り {len(present)}件, {total / 1024 / 1024:.1f}MB)")
+        return stats, present
+
+    @staticmethod
+    def _remove_file(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"キャッシュファイル'{path}'の削除に失敗: {e}")
+            return False
+
+    async def sweep(self) -> dict:
+        """sweep_disk をディスク書き込み用のスレッドで実行する（書き込み中のファイルと競合しないように）"""
+        # _last_used はイベントループ側でだけ読み書きする（掃除スレッドにはコピーを渡す）
+        snapshot = dict(_last_used)
+        stats, present = await asyncio.get_running_loop().run_in_executor(_disk_writer, self.sweep_disk, snapshot)
+        # もう存在しないファイルの記録は捨てる（掃除中に使われたものは残す）
+        for path, used_at in snapshot.items():
+            if path not in present and _last_used.get(path) == used_at:
+                del _last_used[path]
+        return stats
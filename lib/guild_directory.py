@@ -0,0 +1,114 @@
+import logging
+from datetime import datetime, timezone
+from typing import Callable
+
+from lib.search_index import SearchIndex
+from lib.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class GuildDirectory:
+    """
+    Wynncraftの全ギルド一覧（名前・prefix・uuid）をメモリに持つ共有ディレクトリ。
+    /v3/guild/list/guild の取得結果で差分更新し、名前とprefixの両方から検索できる。
+    名前・prefix（大文字小文字を区別しない）からギルドを引く逆引きも持つ。
+    """
+    def __init__(self):
+        self._guilds: dict[str, tuple[str, str | None]] = {}  # 名前 -> (prefix, uuid)
+        self._by_name: dict[str, str] = {}    # 小文字の名前 -> 名前
+        self._by_prefix: dict[str, str] = {}  # 小文字のprefix -> 名前
+        self._index = SearchIndex()
+        self._refresh_flight = SingleFlight("GuildDirectory")
+        self.updated_at: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def _put(self, name: str, prefix: str, uuid: str | None) -> bool:
+        """1ギルド分を登録する（変化がなければFalse）"""
+        entry = (prefix, uuid)
+        old = self._guilds.get(name)
+        if old == entry:
+            return False
+        if old is not None:
+            self._drop(name)
+        self._guilds[name] = entry
+        self._by_name[name.casefold()] = name
+        self._index.add(name, name)
+        if prefix:
+            self._by_prefix[prefix.casefold()] = name
+            self._index.add(prefix, name)
+        return True
+
+    def _drop(self, name: str):
+        prefix, _ = self._guilds.pop(name)
+        if self._by_name.get(name.casefold()) == name:
+            del self._by_name[name.casefold()]
+        if prefix and self._by_prefix.get(prefix.casefold()) == name:
+            del self._by_prefix[prefix.casefold()]
+        self._index.remove(name)
+
+    def update(self, all_guilds: dict):
+        """get_all_guilds() の結果 {名前: {uuid, prefix}} で差分だけ反映する"""
+        added = changed = 0
+        for name, info in all_guilds.items():
+            if not name or not isinstance(info, dict):
+                continue
+            existed = name in self._guilds
+            if self._put(name, info.get("prefix") or "", info.get("uuid")):
+                if existed:
+                    changed += 1
+                else:
+                    added += 1
+
+        removed = [name for name in self._guilds if name not in all_guilds]
+        for name in removed:
+            self._drop(name)
+        self.updated_at = datetime.now(timezone.utc)
+        logger.info(f"[GuildDirectory] ギルド一覧を更新しました: 全{len(self._guilds):,}件 (追加 {added} / 変更 {changed} / 削除 {len(removed)})")
+
+    async def refresh(self, api) -> bool:
+        """ギルド一覧をAPIから取り直す（同時に呼ばれても取得は1回）"""
+        async def fetch():
+            all_guilds = await api.get_all_guilds()
+            if not all_guilds:
+                logger.warning("[GuildDirectory] ギルド一覧の取得に失敗しました")
+                return False
+            self.update(all_guilds)
+            return True
+        return await self._refresh_flight.do("all", fetch)
+
+    def remember(self, guild_data: dict):
+        """個別に取得したギルドの詳細データを一覧に反映する（一覧更新前に作られたギルド用）"""
+        name = guild_data.get("name")
+        if name:
+            self._put(name, guild_data.get("prefix") or "", guild_data.get("uuid"))
+
+    def resolve(self, query: str) -> tuple[str, str, str | None] | None:
+        """
+        prefixまたは名前から (名前, prefix, uuid) を返す。見つからなければNone。
+        従来の検索順に合わせてprefixとしての一致を優先する。
+        """
+        key = query.strip().casefold()
+        name = self._by_prefix.get(key) or self._by_name.get(key)
+        if name is None:
+            return None
+        prefix, uuid = self._guilds[name]
+        return name, prefix, uuid
+
+    def search(self, query: str, limit: int = 25, accept: Callable[[str, str], bool] | None = None) -> list[tuple[str, str]]:
+        """名前またはprefixで検索し (名前, prefix) のリストを返す。acceptを渡すと (名前, prefix) で候補を絞る"""
+        value_filter = None
+        if accept is not None:
+            value_filter = lambda name: accept(name, self._guilds[name][0])
+        return [(name, self._guilds[name][0]) for name in self._index.search(query, limit, value_filter)]
+
+
+_directory: GuildDirectory | None = None
+
+def get_guild_directory() -> GuildDirectory:
+    """プロセス内で共有するギルドディレクトリを返す"""
+    global _directory
+    if _directory is None:
+        _directory = GuildDirectory()
+    return _directory
@@ -5,9 +5,10 @@ import os
 import logging
 import random
 import math
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Optional
 
 from lib.api_stocker import WynncraftAPI
+from lib.projections import GuildSummary
 
 logger = logging.getLogger(__name__)
 
@@ -425,8 +426,7 @@ def create_card_background(w: int, h: int,
 
     return composed
 
-async def get_player_class(player_name: str) -> Optional[str]:
-    api = WynncraftAPI()
+async def get_player_class(player_name: str, api: WynncraftAPI) -> Optional[str]:
     try:
         player_data = await api.get_official_player_data(player_name)
         if not player_data or not isinstance(player_data, dict):
@@ -451,23 +451,9 @@ async def get_player_class(player_name: str) -> Optional[str]:
     except Exception as e:
         logger.warning(f"get_player_class失敗: {player_name}: {e}")
         return None
-    finally:
-        await api.close()
-
-async def create_guild_image(guild_data: Dict[str, Any], banner_renderer, max_width: int = CANVAS_WIDTH) -> BytesIO:
-    def sg(d, *keys, default="N/A"):
-        v = d
-        for k in keys:
-            if not isinstance(v, dict):
-                return default
-            v = v.get(k)
-            if v is None:
-                return default
-        return v
 
+async def create_guild_image(guild: GuildSummary, banner_renderer, wynn_api: WynncraftAPI, max_width: int = CANVAS_WIDTH) -> BytesIO:
     # --- メンバー情報取得 ---
-    members = guild_data.get("members", {}) or {}
-    online_players: List[Dict[str, str]] = []
     rank_to_stars = {
         "OWNER": "★★★★★",
         "CHIEF": "★★★★",
@@ -476,47 +462,28 @@ async def create_guild_image(guild_data: Dict[str, Any], banner_renderer, max_wi
         "RECRUITER": "★",
         "RECRUIT": ""
     }
-    for rank_name, rank_group in members.items():
-        if not isinstance(rank_group, dict):
-            continue
-        for player_name, payload in rank_group.items():
-            if isinstance(payload, dict):
-                player_data = payload
-                if player_data.get("online"):
-                    online_players.append({
-                        "name": player_name,
-                        "server": player_data.get("server", "N/A"),
-                        "rank_stars": rank_to_stars.get(rank_name.upper(), ""),
-                        "rank": rank_name.upper()
-                    })
-
-    prefix = sg(guild_data, "prefix", default="")
-    name = sg(guild_data, "name", default="Unknown Guild")
-    owner_list = guild_data.get("members", {}).get("owner", {}) or {}
-    owner = list(owner_list.keys())[0] if owner_list else "N/A"
-    created = sg(guild_data, "created", default="N/A")
-    if isinstance(created, str) and "T" in created:
-        created = created.split("T")[0]
-    level = sg(guild_data, "level", default=0)
-    xpPercent = sg(guild_data, "xpPercent", default=0)
-    wars = sg(guild_data, "wars", default=0)
-    territories = sg(guild_data, "territories", default=0)
-    total_members = sg(guild_data, "members", "total", default=0)
-
-    season_ranks = guild_data.get("seasonRanks") or {}
-    latest_season = "N/A"
-    rating_display = "N/A"
-    if isinstance(season_ranks, dict) and season_ranks:
-        try:
-            latest_season = str(max(int(k) for k in season_ranks.keys()))
-            rating = season_ranks.get(latest_season, {}).get("rating", "N/A")
-            rating_display = f"{rating:,}" if isinstance(rating, int) else rating
-        except Exception:
-            latest_season = "N/A"
+    online_players: List[Dict[str, str]] = [
+        {"name": player_name, "server": server, "rank_stars": rank_to_stars.get(rank, ""), "rank": rank}
+        for player_name, server, rank in guild.online_members
+    ]
+
+    prefix = guild.prefix
+    name = guild.name
+    owner = guild.owner
+    created = guild.created
+    level = guild.level
+    xpPercent = guild.xp_percent
+    wars = guild.wars
+    territories = guild.territories
+    total_members = guild.total_members
+
+    latest_season = guild.latest_season
+    rating = guild.season_rating
+    rating_display = f"{rating:,}" if isinstance(rating, int) else rating
 
     banner_img = None
     try:
-        banner_bytes = banner_renderer.create_banner_image(guild_data.get("banner")) if banner_renderer is not None else None
+        banner_bytes = banner_renderer.create_banner_image(guild.banner) if banner_renderer is not None else None
         if banner_bytes:
             if isinstance(banner_bytes, (bytes, bytearray)):
                 banner_img = Image.open(BytesIO(banner_bytes)).convert("RGBA")
@@ -823,7 +790,7 @@ async def create_guild_image(guild_data: Dict[str, Any], banner_renderer, max_wi
     
     # オンラインの場合はクラス情報も取得
     if owner_is_online:
-        owner_class_type = await get_player_class(owner)
+        owner_class_type = await get_player_class(owner, wynn_api)
     
     # オーナー描画の座標計算
     owner_text_x = stats_x + icon_size + 8
@@ -923,7 +890,7 @@ async def create_guild_image(guild_data: Dict[str, Any], banner_renderer, max_wi
             # --- 一列目 ---
             x1 = role_x1
             y1 = member_y
-            class_type1 = await get_player_class(p1["name"])
+            class_type1 = await get_player_class(p1["name"], wynn_api)
             icon_x1 = x1
             icon_y1 = y1
             if class_type1 and class_type1 in class_icons and class_icons[class_type1]:
@@ -997,7 +964,7 @@ async def create_guild_image(guild_data: Dict[str, Any], banner_renderer, max_wi
             if p2:
                 x2 = role_x2
                 y2 = member_y
-                class_type2 = await get_player_class(p2["name"])
+                class_type2 = await get_player_class(p2["name"], wynn_api)
                 icon_x2 = x2
                 icon_y2 = y2
                 if class_type2 and class_type2 in class_icons and class_icons[class_type2]:
@@ -0,0 +1,32 @@
+import aiohttp
+import logging
+
+logger = logging.getLogger(__name__)
+
+class HttpClient:
+    """
+    Bot全体で共有するHTTPクライアント（aiohttpのセッションと接続プール）。
+    Botのsetup_hookで1つだけ作り、WynncraftAPI・OtherAPIへ session として渡す。
+    ホストごとのKeep-Alive接続とDNSキャッシュを使い回し、TLSハンドシェイクを減らす。
+    """
+    def __init__(self, limit: int = 40, limit_per_host: int = 10, keepalive_timeout: float = 60, dns_cache_ttl: int = 300):
+        connector = aiohttp.TCPConnector(
+            limit=limit,  # 総接続数制限
+            limit_per_host=limit_per_host,  # ホスト別接続数制限
+            ttl_dns_cache=dns_cache_ttl,  # DNS キャッシュ時間
+            use_dns_cache=True,  # DNS キャッシュ有効
+            keepalive_timeout=keepalive_timeout,  # Keep-Alive タイムアウト
+            enable_cleanup_closed=True  # 閉じた接続のクリーンアップ
+        )
+        # ヘッダーは共有しない（認証ヘッダー等は各APIクラスがリクエストごとに付ける）
+        self.session = aiohttp.ClientSession(connector=connector)
+        logger.info(f"[HttpClient] 共有HTTPセッションを作成しました (limit={limit}, per_host={limit_per_host})")
+
+    @property
+    def closed(self) -> bool:
+        return self.session.closed
+
+    async def close(self):
+        if not self.session.closed:
+            await self.session.close()
+            logger.info("[HttpClient] 共有HTTPセッションを閉じました")
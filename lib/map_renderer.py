@@ -1,30 +1,93 @@
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 import os
+import mmap
+import struct
 import logging
-import json
 import discord
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
-from math import sqrt
+from math import sqrt, floor, ceil
+
+from lib.territory_store import get_territory_store, coord_to_pixel
+from lib.utils import atomic_write_bytes, source_file_tag
 
 logger = logging.getLogger(__name__)
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ASSETS_PATH = os.path.join(project_root, "assets", "map")
 FONT_PATH = os.path.join(project_root, "assets", "fonts", "Minecraftia-Regular.ttf")
+BASE_MAP_PATH = os.path.join(ASSETS_PATH, "main-map.png")
+BASE_MAP_CACHE_DIR = os.path.join(project_root, "cache", "map")
+BASE_MAP_WIDTH = 1600
+# 交易路レイヤーキャッシュの上限（全体マップ1枚 ≒ 16MB）。
+# ズーム表示の範囲は所有状況で毎回変わり当たらないうえ、表示範囲内だけなら描き直しも軽いので全体マップ分だけ持つ
+ROUTE_LAYER_CACHE_BYTES = 20 * 1024 * 1024
+# 所有者が変わった領地がこの割合を超えたら差分描画をやめて全体を描き直す
+INCREMENTAL_MAX_CHANGED_RATIO = 0.25
+# 空間インデックスのセルサイズと、ラベル・保持時間のはみ出しを見込んだ検索余白（縮小後px）
+SPATIAL_GRID_CELL_SIZE = 64
+VIEWPORT_LABEL_MARGIN = 80
+
+# 縮小済みベースマップの生RGBAファイル: マジック, 幅, 高さ, 縮尺 + ピクセル列
+_BASE_MAP_MAGIC = b"ETKWMAP1"
+_BASE_MAP_HEADER = struct.Struct("<8sIId")
+
+class SpatialGrid:
+    """矩形を一様グリッドに登録し、指定範囲と交差する要素を引く簡易空間インデックス"""
+    def __init__(self, cell_size: int = SPATIAL_GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = defaultdict(list)
+        self._boxes = {}
+
+    def _cell_range(self, box):
+        c = self.cell_size
+        return range(int(floor(box[0] / c)), int(floor(box[2] / c)) + 1), range(int(floor(box[1] / c)), int(floor(box[3] / c)) + 1)
+
+    def insert(self, key, box):
+        self._boxes[key] = box
+        xs, ys = self._cell_range(box)
+        for cx in xs:
+            for cy in ys:
+                self._cells[(cx, cy)].append(key)
+
+    def query(self, box) -> set:
+        """boxと交差する要素のキー集合を返す"""
+        found = set()
+        xs, ys = self._cell_range(box)
+        for cx in xs:
+            for cy in ys:
+                for key in self._cells.get((cx, cy), ()):
+                    if key in found:
+                        continue
+                    b = self._boxes[key]
+                    if b[0] <= box[2] and b[2] >= box[0] and b[1] <= box[3] and b[3] >= box[1]:
+                        found.add(key)
+        return found
+
 
 class MapRenderer:
     def __init__(self):
         try:
-            with open(os.path.join(ASSETS_PATH, "territories.json"), "r", encoding='utf-8') as f:
-                self.local_territories = json.load(f)
+            self.store = get_territory_store()
             self.font_path = FONT_PATH
+            # 常駐ワーカー用: 縮小済みベースマップを保持して使い回す
+            self._base_map = None
+            self._base_scale = None
+            self._base_map_mmap = None
+            self._route_edges = None
+            self._route_layers = OrderedDict()
+            self._route_layer_bytes = 0
+            self._fonts = None
+            self._spatial_index = None
+            self._map_snapshot = None  # 差分描画用: 前回描画したマップと所有者
         except FileNotFoundError as e:
             logger.error(f"マップ生成に必要なアセットが見つかりません: {e}")
             raise
 
     def _coord_to_pixel(self, x, z):
-        return x + 2560, z + 6632
+        return coord_to_pixel(x, z)
 
     def _hex_to_rgb(self, hex_color: str) -> tuple:
         hex_color = hex_color.lstrip('#')
@@ -89,108 +152,209 @@ class MapRenderer:
         embed.set_footer(text="Territory Statistics | Onyx_")
         return embed
 
-    def _get_map_and_scale(self):
-        map_img = Image.open(os.path.join(ASSETS_PATH, "main-map.png")).convert("RGBA")
-        TARGET_WIDTH = 1600
+    def preload(self):
+        """縮小済みベースマップを読み込んで保持する（常駐ワーカー用）"""
+        if self._base_map is None:
+            self._base_map, self._base_scale = self._load_scaled_map()
+
+    def release_render_caches(self):
+        """差分描画用のスナップショットと交易路レイヤーを手放す（ワーカーが暇なとき・データが飛んだとき用）"""
+        if self._map_snapshot is not None:
+            self._map_snapshot["image"].close()
+            self._map_snapshot = None
+        for layer in self._route_layers.values():
+            layer.close()
+        self._route_layers.clear()
+        self._route_layer_bytes = 0
+
+    def _base_map_cache_path(self, width: int) -> str:
+        return os.path.join(BASE_MAP_CACHE_DIR, f"main-map_{width}_{source_file_tag(BASE_MAP_PATH)}.rgba")
+
+    def _load_scaled_map(self):
+        cache_path = self._base_map_cache_path(BASE_MAP_WIDTH)
+        cached = self._open_base_map_cache(cache_path)
+        if cached is not None:
+            return cached
+
+        map_img = Image.open(BASE_MAP_PATH).convert("RGBA")
         original_w, original_h = map_img.size
-        scale_factor = TARGET_WIDTH / original_w
+        scale_factor = BASE_MAP_WIDTH / original_w
         new_h = int(original_h * scale_factor)
-        resized_map = map_img.resize((TARGET_WIDTH, new_h), Image.Resampling.LANCZOS)
+        resized_map = map_img.resize((BASE_MAP_WIDTH, new_h), Image.Resampling.LANCZOS)
         map_img.close()
+        self._write_base_map_cache(cache_path, resized_map, scale_factor)
         return resized_map, scale_factor
 
+    def _open_base_map_cache(self, cache_path: str):
+        """生RGBAキャッシュをmmapで開く（複数ワーカー間でページキャッシュを共有できる）"""
+        try:
+            with open(cache_path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        except Exception as e:
+            logger.warning(f"ベースマップキャッシュの読み込みに失敗: {e}")
+            return None
+        try:
+            magic, width, height, scale_factor = _BASE_MAP_HEADER.unpack_from(mm, 0)
+            if magic != _BASE_MAP_MAGIC or len(mm) != _BASE_MAP_HEADER.size + width * height * 4:
+                raise ValueError("ヘッダーまたはサイズが不正です")
+            pixels = memoryview(mm)[_BASE_MAP_HEADER.size:]
+            base_map = Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+        except Exception as e:
+            logger.warning(f"ベースマップキャッシュが壊れているため作り直します: {e}")
+            mm.close()
+            return None
+        self._base_map_mmap = mm
+        return base_map, scale_factor
+
+    def _write_base_map_cache(self, cache_path: str, resized_map, scale_factor: float):
+        try:
+            os.makedirs(BASE_MAP_CACHE_DIR, exist_ok=True)
+            header = _BASE_MAP_HEADER.pack(_BASE_MAP_MAGIC, resized_map.width, resized_map.height, scale_factor)
+            atomic_write_bytes(cache_path, header + resized_map.tobytes("raw", "RGBA"))
+            # 古い元画像向けのキャッシュを掃除
+            prefix = f"main-map_{BASE_MAP_WIDTH}_"
+            for fname in os.listdir(BASE_MAP_CACHE_DIR):
+                fpath = os.path.join(BASE_MAP_CACHE_DIR, fname)
+                if fname.startswith(prefix) and fname.endswith(".rgba") and fpath != cache_path:
+                    os.remove(fpath)
+            logger.info(f"縮小済みベースマップをキャッシュしました: {cache_path}")
+        except Exception as e:
+            logger.warning(f"ベースマップキャッシュの書き込みに失敗: {e}")
+
     def _get_font(self, size):
         try:
             return ImageFont.truetype(self.font_path, size)
         except Exception:
             return ImageFont.load_default()
 
-    def _draw_trading_and_territories(self, map_to_draw_on, box, is_zoomed, territory_data, guild_color_map, show_held_time=False, upscale_factor=1.5):
-        upscaled_lines = None
-        overlay = None
+    def _get_route_edges(self) -> list:
+        """交易路を重複なし(A-BとB-Aを1本)の中心座標ペアとして返す"""
+        if self._route_edges is None:
+            c = self.store.centers
+            self._route_edges = [((c[i * 2], c[i * 2 + 1]), (c[j * 2], c[j * 2 + 1])) for i, j in self.store.route_edges()]
+        return self._route_edges
 
+    def _get_spatial_index(self) -> tuple[SpatialGrid, SpatialGrid]:
+        """現在の縮尺での領地矩形・交易路の空間インデックスを返す"""
+        if self._spatial_index is None or self._spatial_index[0] != self.scale_factor:
+            territory_grid = SpatialGrid()
+            for i, name in enumerate(self.store.names):
+                territory_grid.insert(name, self._territory_rect(i, (0, 0)))
+            route_grid = SpatialGrid()
+            for i, ((px1, py1), (px2, py2)) in enumerate(self._get_route_edges()):
+                sx1, sy1, sx2, sy2 = px1 * self.scale_factor, py1 * self.scale_factor, px2 * self.scale_factor, py2 * self.scale_factor
+                route_grid.insert(i, (min(sx1, sx2) - 2, min(sy1, sy2) - 2, max(sx1, sx2) + 2, max(sy1, sy2) + 2))
+            self._spatial_index = (self.scale_factor, territory_grid, route_grid)
+        return self._spatial_index[1:]
+
+    def _visible_territory_names(self, view_box) -> set:
+        """表示範囲（ラベルのはみ出し分を含む）に掛かる領地名を返す"""
+        territory_grid, _ = self._get_spatial_index()
+        m = VIEWPORT_LABEL_MARGIN
+        return territory_grid.query((view_box[0] - m, view_box[1] - m, view_box[2] + m, view_box[3] + m))
+
+    @contextmanager
+    def _route_layer(self, size: tuple, box, upscale_factor: float):
+        """
+        交易路レイヤー(RGBA)を貸し出す。交易路はterritories.jsonのみに依存するため、
+        全体マップ(boxなし)の分は(縮尺, サイズ)ごとに一度だけ描画してキャッシュする。
+        ズーム表示の分はその場で描き、使い終わったら閉じる。
+        """
+        if box:
+            layer = self._render_route_layer(size, box, upscale_factor)
+            try:
+                yield layer
+            finally:
+                layer.close()
+            return
+
+        key = (round(self.scale_factor, 6), size, upscale_factor)
+        layer = self._route_layers.get(key)
+        if layer is not None:
+            self._route_layers.move_to_end(key)
+        else:
+            layer = self._render_route_layer(size, None, upscale_factor)
+            self._route_layers[key] = layer
+            self._route_layer_bytes += layer.width * layer.height * 4
+            # 合計サイズが上限を超えたら古いレイヤーから破棄（直近の1枚は必ず残す）
+            while self._route_layer_bytes > ROUTE_LAYER_CACHE_BYTES and len(self._route_layers) > 1:
+                _, old = self._route_layers.popitem(last=False)
+                self._route_layer_bytes -= old.width * old.height * 4
+                old.close()
+        yield layer
+
+    def _render_route_layer(self, size: tuple, box, upscale_factor: float):
+        """交易路を高解像度で描いて縮小したレイヤーを作る（表示範囲があればそこに掛かる交易路だけ）"""
+
+        scale = self.scale_factor * upscale_factor
+        offset_x = box[0] * upscale_factor if box else 0
+        offset_y = box[1] * upscale_factor if box else 0
+        up_w, up_h = int(size[0] * upscale_factor), int(size[1] * upscale_factor)
+        upscaled_lines = Image.new("RGBA", (up_w, up_h), (0, 0, 0, 0))
         try:
-            # コネクション線の描画
-            up_w, up_h = int(map_to_draw_on.width * upscale_factor), int(map_to_draw_on.height * upscale_factor)
-            upscaled_lines = Image.new("RGBA", (up_w, up_h), (0, 0, 0, 0))
             draw_lines = ImageDraw.Draw(upscaled_lines)
-            for name, data in self.local_territories.items():
-                if "Trading Routes" not in data or "Location" not in data:
-                    continue
-                try:
-                    x1 = (data["Location"]["start"][0] + data["Location"]["end"][0]) // 2
-                    z1 = (data["Location"]["start"][1] + data["Location"]["end"][1]) // 2
-                    l_px1, l_py1 = self._coord_to_pixel(x1, z1)
-                    l_scaled_px1, l_scaled_py1 = l_px1 * self.scale_factor * upscale_factor, l_py1 * self.scale_factor * upscale_factor
-                    for destination_name in data["Trading Routes"]:
-                        dest_data = self.local_territories.get(destination_name)
-                        if not dest_data or "Location" not in dest_data:
-                            continue
-                        x2 = (dest_data["Location"]["start"][0] + dest_data["Location"]["end"][0]) // 2
-                        z2 = (dest_data["Location"]["start"][1] + dest_data["Location"]["end"][1]) // 2
-                        l_px2, l_py2 = self._coord_to_pixel(x2, z2)
-                        l_scaled_px2, l_scaled_py2 = l_px2 * self.scale_factor * upscale_factor, l_py2 * self.scale_factor * upscale_factor
-                        if is_zoomed and box:
-                            l_px1_rel = l_scaled_px1 - box[0] * upscale_factor
-                            l_py1_rel = l_scaled_py1 - box[1] * upscale_factor
-                            l_px2_rel = l_scaled_px2 - box[0] * upscale_factor
-                            l_py2_rel = l_scaled_py2 - box[1] * upscale_factor
-                            points = [(l_px1_rel, l_py1_rel), (l_px2_rel, l_py2_rel)]
-                        else:
-                            points = [(l_scaled_px1, l_scaled_py1), (l_scaled_px2, l_scaled_py2)]
-                        color_rgb = (30, 30, 30)
-                        draw_lines.line(points, fill=(*color_rgb, 180), width=3)
-                except KeyError:
-                    continue
-            lines_down = upscaled_lines.resize((map_to_draw_on.width, map_to_draw_on.height), resample=Image.Resampling.LANCZOS)
-            map_to_draw_on.alpha_composite(lines_down)
-            del draw_lines, lines_down
+            color_rgb = (30, 30, 30)
+            edges = self._get_route_edges()
+            if box:
+                # 表示範囲と交差する交易路だけを描く
+                _, route_grid = self._get_spatial_index()
+                edges = [edges[i] for i in sorted(route_grid.query(box))]
+            for (px1, py1), (px2, py2) in edges:
+                points = [
+                    (px1 * scale - offset_x, py1 * scale - offset_y),
+                    (px2 * scale - offset_x, py2 * scale - offset_y)
+                ]
+                draw_lines.line(points, fill=(*color_rgb, 180), width=3)
+            del draw_lines
+            return upscaled_lines.resize(size, resample=Image.Resampling.LANCZOS)
+        finally:
+            upscaled_lines.close()
 
-            # 領地描画
-            overlay = Image.new("RGBA", map_to_draw_on.size, (0,0,0,0))
-            overlay_draw = ImageDraw.Draw(overlay)
-            draw = ImageDraw.Draw(map_to_draw_on)
+    def _get_fonts(self):
+        """現在の縮尺に合わせたギルド名・保持時間用フォントを返す"""
+        if self._fonts is None or self._fonts[0] != self.scale_factor:
             scaled_font_size = max(12, int(self._get_font(40).size * self.scale_factor))
-            scaled_font = self._get_font(scaled_font_size)
             time_font_size = max(8, int(scaled_font_size * 0.6))
-            time_font = self._get_font(time_font_size)
-            
-            for name, info in territory_data.items():
-                static = self.local_territories.get(name)
-                if not static or "Location" not in static:
+            self._fonts = (
+                self.scale_factor,
+                self._get_font(scaled_font_size),
+                scaled_font_size,
+                self._get_font(time_font_size)
+            )
+        return self._fonts[1:]
+
+    def _territory_rect(self, index: int, origin: tuple) -> tuple:
+        """領地(ストアのインデックス)の矩形を描画先キャンバス上の座標で返す（originはキャンバス左上の縮小後座標）"""
+        rects = self.store.scaled_rects(self.scale_factor)
+        k = index * 4
+        return rects[k] - origin[0], rects[k + 1] - origin[1], rects[k + 2] - origin[0], rects[k + 3] - origin[1]
+
+    def _territory_owner(self, info: dict, guild_color_map: dict) -> tuple:
+        """領地の表示prefixと枠色を返す（無所属は"None"・白色）"""
+        if "guild" not in info or not info["guild"].get("prefix"):
+            return "None", (255, 255, 255)
+        prefix = info["guild"]["prefix"]
+        return prefix, self._hex_to_rgb(guild_color_map.get(prefix, "#FFFFFF"))
+
+    def _draw_territories(self, map_to_draw_on, territory_items, guild_color_map, origin=(0, 0), show_held_time=False):
+        overlay = Image.new("RGBA", map_to_draw_on.size, (0,0,0,0))
+        try:
+            overlay_draw = ImageDraw.Draw(overlay)
+            draw = ImageDraw.Draw(map_to_draw_on)
+            scaled_font, scaled_font_size, time_font = self._get_fonts()
+
+            store_index = self.store.index
+            for name, info in territory_items:
+                index = store_index.get(name)
+                if index is None:
                     continue
-                
-                # ギルドデータがない場合のデフォルト値を設定
-                if "guild" not in info or not info["guild"].get("prefix"):
-                    # 無所属領地として扱う
-                    guild_info = {
-                        "prefix": "None",
-                        "name": "No Owner"
-                    }
-                    prefix = "None"
-                else:
-                    guild_info = info["guild"]
-                    prefix = info["guild"]["prefix"]
-                
-                t_px1, t_py1 = self._coord_to_pixel(*static["Location"]["start"])
-                t_px2, t_py2 = self._coord_to_pixel(*static["Location"]["end"])
-                t_scaled_px1, t_scaled_py1 = t_px1 * self.scale_factor, t_py1 * self.scale_factor
-                t_scaled_px2, t_scaled_py2 = t_px2 * self.scale_factor, t_py2 * self.scale_factor
-                if is_zoomed and box:
-                    t_px1_rel, t_px2_rel = t_scaled_px1 - box[0], t_scaled_px2 - box[0]
-                    t_py1_rel, t_py2_rel = t_scaled_py1 - box[1], t_scaled_py2 - box[1]
-                else:
-                    t_px1_rel, t_py1_rel, t_px2_rel, t_py2_rel = t_scaled_px1, t_scaled_py1, t_scaled_px2, t_scaled_py2
-                x_min, x_max = sorted([t_px1_rel, t_px2_rel])
-                y_min, y_max = sorted([t_py1_rel, t_py2_rel])
-                
-                # 無所属領地の場合は白色、それ以外はギルドカラー
-                if prefix == "None":
-                    color_hex = "#FFFFFF"  # 白色
-                else:
-                    color_hex = guild_color_map.get(prefix, "#FFFFFF")
-                    
-                color_rgb = self._hex_to_rgb(color_hex)
+
+                # ギルドデータがない場合は無所属領地として白色で描画
+                prefix, color_rgb = self._territory_owner(info, guild_color_map)
+                x_min, y_min, x_max, y_max = self._territory_rect(index, origin)
+
                 overlay_draw.rectangle([x_min, y_min, x_max, y_max], fill=(*color_rgb, 64))
                 draw.rectangle([x_min, y_min, x_max, y_max], outline=color_rgb, width=2)
                 
@@ -247,10 +411,20 @@ class MapRenderer:
             map_to_draw_on.alpha_composite(overlay)
             del overlay_draw, draw
         finally:
-            if upscaled_lines is not None:
-                upscaled_lines.close()
-            if overlay is not None:
-                overlay.close()
+            overlay.close()
+
+    def _draw_trading_and_territories(self, map_to_draw_on, box, is_zoomed, territory_data, guild_color_map, show_held_time=False, upscale_factor=1.5):
+        view_box = box if is_zoomed and box else None
+        # コネクション線の描画（全体マップは静的レイヤーをキャッシュから合成）
+        with self._route_layer(map_to_draw_on.size, view_box, upscale_factor) as route_layer:
+            map_to_draw_on.alpha_composite(route_layer)
+        # 領地描画（ズーム時は表示範囲に掛かる領地だけ）
+        origin = (view_box[0], view_box[1]) if view_box else (0, 0)
+        territory_items = territory_data.items()
+        if view_box:
+            visible = self._visible_territory_names(view_box)
+            territory_items = [(name, info) for name, info in territory_items if name in visible]
+        self._draw_territories(map_to_draw_on, territory_items, guild_color_map, origin, show_held_time)
 
     def draw_territories_on_map(self, territory_data, guild_color_map, box=None, is_zoomed=False, map_to_draw_on=None, show_held_time=False):
         """領地をマップ上に描画する（HQ機能なし）"""
@@ -261,19 +435,143 @@ class MapRenderer:
             logger.error(f"領地描画中にエラー: {e}")
             return map_to_draw_on
 
+    def _render_map(self, box, is_zoomed, territory_data, guild_color_map, show_held_time=False):
+        map_to_draw_on = self._base_map.crop(box) if box else self._base_map.copy()
+        return self.draw_territories_on_map(
+            territory_data=territory_data,
+            guild_color_map=guild_color_map,
+            box=box,
+            is_zoomed=is_zoomed,
+            map_to_draw_on=map_to_draw_on,
+            show_held_time=show_held_time
+        )
+
+    def _label_extent(self, name: str, prefix: str, origin: tuple) -> tuple:
+        """領地の矩形とギルド名ラベルを合わせた描画範囲（整数座標）を返す"""
+        scaled_font = self._get_fonts()[0]
+        x_min, y_min, x_max, y_max = self._territory_rect(self.store.index[name], origin)
+        center_x = (x_min + x_max) / 2
+        center_y = (y_min + y_max) / 2
+        tx0, ty0, tx1, ty1 = scaled_font.getbbox(prefix, stroke_width=2, anchor="mm")
+        margin = 2
+        return (
+            int(floor(min(x_min, center_x + tx0))) - margin,
+            int(floor(min(y_min, center_y + ty0))) - margin,
+            int(ceil(max(x_max, center_x + tx1))) + margin,
+            int(ceil(max(y_max, center_y + ty1))) + margin
+        )
+
+    def _render_map_incremental(self, box, is_zoomed, territory_data, guild_color_map):
+        """
+        保持時間なしのマップを、前回描画したスナップショットとの所有者差分だけ再描画して返す。
+        変化した領地の矩形・ラベル範囲を下地から描き直し、その範囲に掛かる領地だけを重ね直す。
+        返り値はスナップショット本体なので呼び出し側でcloseしないこと。
+        """
+        view_box = box if is_zoomed and box else None
+        origin = (view_box[0], view_box[1]) if view_box else (0, 0)
+        owners = {
+            name: self._territory_owner(info, guild_color_map)
+            for name, info in territory_data.items()
+            if name in self.store
+        }
+        snapshot = self._map_snapshot
+        view_key = (round(self.scale_factor, 6), tuple(round(v, 2) for v in view_box) if view_box else None)
+
+        changed = None
+        if snapshot is not None and snapshot["view_key"] == view_key and list(snapshot["owners"]) == list(owners):
+            changed = [name for name, owner in owners.items() if snapshot["owners"][name] != owner]
+            if len(changed) > len(owners) * INCREMENTAL_MAX_CHANGED_RATIO:
+                changed = None
+
+        if changed is None:
+            if snapshot is not None:
+                snapshot["image"].close()
+            self._map_snapshot = None
+            image = self._render_map(box, is_zoomed, territory_data, guild_color_map)
+            extents = {name: self._label_extent(name, owners[name][0], origin) for name in owners}
+            self._map_snapshot = {"view_key": view_key, "owners": owners, "extents": extents, "image": image}
+            return image
+
+        image = snapshot["image"]
+        extents = snapshot["extents"]
+        dirty = []
+        for name in changed:
+            old = extents[name]
+            new = self._label_extent(name, owners[name][0], origin)
+            extents[name] = new
+            dirty.append((
+                max(0, min(old[0], new[0])),
+                max(0, min(old[1], new[1])),
+                min(image.width, max(old[2], new[2])),
+                min(image.height, max(old[3], new[3]))
+            ))
+
+        with self._route_layer(image.size, view_box, 1.5) as route_layer:
+            # crop()は座標を丸めるため、キャンバスとベースマップのずれも丸めた値で合わせる
+            base_dx, base_dy = (round(view_box[0]), round(view_box[1])) if view_box else (0, 0)
+            for rx0, ry0, rx1, ry1 in dirty:
+                if rx0 >= rx1 or ry0 >= ry1:
+                    continue
+                # 再描画範囲に掛かる領地は描画順を保ったまま全て重ね直す
+                names = [
+                    name for name in owners
+                    if extents[name][0] < rx1 and extents[name][2] > rx0 and extents[name][1] < ry1 and extents[name][3] > ry0
+                ]
+                # PILは負の座標を0方向に丸めるため、掛かる領地全体が収まる範囲で描いてから必要部分だけ貼り戻す
+                cx0 = max(0, min([rx0] + [extents[name][0] for name in names]))
+                cy0 = max(0, min([ry0] + [extents[name][1] for name in names]))
+                cx1 = min(image.width, max([rx1] + [extents[name][2] for name in names]))
+                cy1 = min(image.height, max([ry1] + [extents[name][3] for name in names]))
+                canvas = self._base_map.crop((cx0 + base_dx, cy0 + base_dy, cx1 + base_dx, cy1 + base_dy))
+                try:
+                    route_region = route_layer.crop((cx0, cy0, cx1, cy1))
+                    canvas.alpha_composite(route_region)
+                    route_region.close()
+                    items = [(name, territory_data[name]) for name in names]
+                    self._draw_territories(canvas, items, guild_color_map, (origin[0] + cx0, origin[1] + cy0))
+                    region = canvas.crop((rx0 - cx0, ry0 - cy0, rx1 - cx0, ry1 - cy0))
+                    image.paste(region, (rx0, ry0))
+                    region.close()
+                finally:
+                    canvas.close()
+        snapshot["owners"] = owners
+        logger.info(f"差分描画: {len(changed)}個の領地を再描画しました")
+        return image
+
+    @staticmethod
+    def map_footer_text() -> str:
+        """マップEmbedのフッター（現在時刻入り）"""
+        jst_now = datetime.now(timezone(timedelta(hours=9)))
+        return f"Territory Map ({jst_now.strftime('%Y/%m/%d %H:%M:%S')}) | Onyx_"
+
+    def _create_map_message(self, final_map) -> tuple[discord.File, discord.Embed]:
+        map_bytes = BytesIO()
+        try:
+            final_map.save(map_bytes, format='PNG')
+            map_bytes.seek(0)
+            file = discord.File(map_bytes, filename="wynn_map.png")
+            embed = discord.Embed(
+                title="",
+                color=discord.Color.purple()
+            )
+            embed.set_image(url="attachment://wynn_map.png")
+            embed.set_footer(text=self.map_footer_text())
+            return file, embed
+        finally:
+            map_bytes.close()
+
     # デフォルトマップ生成するやつ
     def create_territory_map(self, territory_data: dict, territories_to_render: dict, guild_color_map: dict, show_held_time: bool = False) -> tuple[discord.File | None, discord.Embed | None]:
         if not territories_to_render:
             return None, None
-        resized_map, scale_factor = self._get_map_and_scale()
-        self.scale_factor = scale_factor
-        map_to_draw_on = None
-        file = None
-        embed = None
-        box = None
-        all_x, all_y = [], []
-        is_zoomed = len(territories_to_render) < len(self.local_territories)
         try:
+            self.preload()
+            scale_factor = self._base_scale
+            self.scale_factor = scale_factor
+            base_w, base_h = self._base_map.size
+            box = None
+            all_x, all_y = [], []
+            is_zoomed = len(territories_to_render) < len(self.store)
             if is_zoomed:
                 for terri_data in territories_to_render.values():
                     loc = terri_data.get("location", {})
@@ -288,48 +586,25 @@ class MapRenderer:
                 box = (
                     max(0, min(all_x) - padding),
                     max(0, min(all_y) - padding),
-                    min(resized_map.width, max(all_x) + padding),
-                    min(resized_map.height, max(all_y) + padding)
-                )
-                cropped = resized_map.crop(box)
-                resized_map.close()
-                map_to_draw_on = cropped
-            else:
-                map_to_draw_on = resized_map
-            final_map = self.draw_territories_on_map(
-                territory_data=territory_data,
-                guild_color_map=guild_color_map,
-                box=box,
-                is_zoomed=is_zoomed,
-                map_to_draw_on=map_to_draw_on,
-                show_held_time=show_held_time
-            )
-            map_bytes = BytesIO()
-            try:
-                final_map.save(map_bytes, format='PNG')
-                map_bytes.seek(0)
-                jst_now = datetime.now(timezone(timedelta(hours=9)))
-                formatted_time = jst_now.strftime("%Y/%m/%d %H:%M:%S")
-                file = discord.File(map_bytes, filename="wynn_map.png")
-                embed = discord.Embed(
-                    title="",
-                    color=discord.Color.purple()
+                    min(base_w, max(all_x) + padding),
+                    min(base_h, max(all_y) + padding)
                 )
-                embed.set_image(url="attachment://wynn_map.png")
-                embed.set_footer(text=f"Territory Map ({formatted_time}) | Onyx_")
-                return file, embed
-            finally:
-                map_bytes.close()
-                final_map.close()
-                map_to_draw_on.close()
+            if show_held_time:
+                final_map = self._render_map(box, is_zoomed, territory_data, guild_color_map, show_held_time=True)
+                try:
+                    return self._create_map_message(final_map)
+                finally:
+                    final_map.close()
+            # 保持時間を出さないマップは所有者の差分だけ描き直す
+            return self._create_map_message(self._render_map_incremental(box, is_zoomed, territory_data, guild_color_map))
         except Exception as e:
             logger.error(f"マップ生成中にエラー: {e}", exc_info=True)
             return None, None
 
     # 単一テリトリー生成
     def create_single_territory_image(self, territory: str, territory_data: dict, guild_color_map: dict) -> BytesIO | None:
-        terri_static = self.local_territories.get(territory)
-        if not terri_static or 'Location' not in terri_static:
+        store_index = self.store.index.get(territory)
+        if store_index is None:
             logger.error(f"'{territory}'にLocationデータがありません。")
             return None
         terri_live = territory_data.get(territory)
@@ -340,43 +615,28 @@ class MapRenderer:
         if not owner_prefix:
             logger.error(f"領地 {territory} の所有ギルドprefixがAPIデータにありません")
             return None
-        resized_map, scale_factor = self._get_map_and_scale()
-        self.scale_factor = scale_factor
-        map_to_draw_on = resized_map
-        final_map = self.draw_territories_on_map(
-            territory_data=territory_data,
-            guild_color_map=guild_color_map,
-            box=None,
-            is_zoomed=False,
-            map_to_draw_on=map_to_draw_on,
-            show_held_time=True  # 単一領地表示では保持時間を表示
-        )
-        static = terri_static
-        loc = static.get("Location", {})
-        px1, py1 = self._coord_to_pixel(*loc.get("start", [0, 0]))
-        px2, py2 = self._coord_to_pixel(*loc.get("end", [0, 0]))
-        px1, py1 = px1 * self.scale_factor, py1 * self.scale_factor
-        px2, py2 = px2 * self.scale_factor, py2 * self.scale_factor
-        left = min(px1, px2)
-        right = max(px1, px2)
-        top = min(py1, py2)
-        bottom = max(py1, py2)
+        self.preload()
+        self.scale_factor = self._base_scale
+        base_w, base_h = self._base_map.size
+
+        # 先に切り抜き範囲を決め、その範囲に掛かるものだけを描画する
+        left, top, right, bottom = self._territory_rect(store_index, (0, 0))
         padding = 50
         box = (
-            max(0, left - padding),
-            max(0, top - padding),
-            min(resized_map.width, right + padding),
-            min(resized_map.height, bottom + padding)
+            max(0, int(round(left - padding))),
+            max(0, int(round(top - padding))),
+            min(base_w, int(round(right + padding))),
+            min(base_h, int(round(bottom + padding)))
         )
         if not (box[0] < box[2] and box[1] < box[3]):
             logger.error(f"'{territory}'の計算後の切り抜き範囲が無効です。Box: {box}")
-            final_map.close()
-            map_to_draw_on.close()
             return None
-        center_x = (px1 + px2) / 2
-        center_y = (py1 + py2) / 2
-        territory_width = abs(px2 - px1)
-        territory_height = abs(py2 - py1)
+        final_map = self._render_map(box, True, territory_data, guild_color_map, show_held_time=True)  # 単一領地表示では保持時間を表示
+
+        center_x = (left + right) / 2 - box[0]
+        center_y = (top + bottom) / 2 - box[1]
+        territory_width = right - left
+        territory_height = bottom - top
         highlight_radius = int(sqrt(territory_width ** 2 + territory_height ** 2) / 2)
         draw = ImageDraw.Draw(final_map)
         draw.ellipse(
@@ -386,15 +646,12 @@ class MapRenderer:
             width=3
         )
         del draw
-        cropped_image = final_map.crop(box)
         map_bytes = BytesIO()
         try:
-            cropped_image.save(map_bytes, format='PNG')
+            final_map.save(map_bytes, format='PNG')
             map_bytes.seek(0)
             result = BytesIO(map_bytes.getvalue())
             return result
         finally:
             map_bytes.close()
-            cropped_image.close()
             final_map.close()
-            map_to_draw_on.close()
@@ -0,0 +1,275 @@
+import os
+import sys
+import struct
+import pickle
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_SCRIPT = os.path.join(project_root, "lib", "subproc_map_worker.py")
+
+# フレーム: 4バイト(ビッグエンディアン)の長さ + pickle本体
+_FRAME_HEADER = struct.Struct(">I")
+# ワーカーが保持しておくスナップショット数（プール側も同じ規則で追跡する）
+WORKER_SNAPSHOT_SLOTS = 2
+# ジョブがこの秒数来なければ、ワーカーは差分描画用の画像などを手放してメモリを返す
+WORKER_IDLE_RELEASE_SECONDS = 120.0
+
+def write_frame(stream, obj):
+    """オブジェクトを長さ付きpickleフレームとして書き込む"""
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_FRAME_HEADER.pack(len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+def _read_exact(stream, size: int) -> bytes | None:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+def read_frame(stream):
+    """長さ付きpickleフレームを1つ読み込む（EOFならNone）"""
+    header = _read_exact(stream, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = _FRAME_HEADER.unpack(header)
+    payload = _read_exact(stream, size)
+    if payload is None:
+        return None
+    return pickle.loads(payload)
+
+
+class RenderSnapshot:
+    """描画に使う領地データとギルドカラーの組。versionで識別し、ワーカーへは初回だけ本体を送る"""
+    __slots__ = ("version", "territory_data", "guild_color_map")
+
+    def __init__(self, version: int, territory_data: dict, guild_color_map: dict):
+        self.version = version
+        self.territory_data = territory_data
+        self.guild_color_map = guild_color_map
+
+    def matches(self, territory_data: dict, guild_color_map: dict) -> bool:
+        return (
+            (self.territory_data is territory_data or self.territory_data == territory_data)
+            and (self.guild_color_map is guild_color_map or self.guild_color_map == guild_color_map)
+        )
+
+    def to_payload(self) -> dict:
+        return {
+            'version': self.version,
+            'territory_data': self.territory_data,
+            'guild_color_map': self.guild_color_map,
+        }
+
+
+class _MapWorker:
+    """常駐ワーカープロセス1つ分のハンドル（asyncioのパイプで通信）"""
+    def __init__(self, worker_id: int, proc: asyncio.subprocess.Process):
+        self.worker_id = worker_id
+        self.proc = proc
+        self.jobs_done = 0
+        # このワーカーが保持しているスナップショットのversion（古い順）
+        self.snapshots: deque[int] = deque(maxlen=WORKER_SNAPSHOT_SLOTS)
+
+    @classmethod
+    async def spawn(cls, worker_id: int) -> "_MapWorker":
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=project_root
+        )
+        return cls(worker_id, proc)
+
+    def is_alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def _exchange(self, job: dict) -> dict | None:
+        payload = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+        self.proc.stdin.write(_FRAME_HEADER.pack(len(payload)))
+        self.proc.stdin.write(payload)
+        await self.proc.stdin.drain()
+        try:
+            header = await self.proc.stdout.readexactly(_FRAME_HEADER.size)
+            (size,) = _FRAME_HEADER.unpack(header)
+            body = await self.proc.stdout.readexactly(size)
+        except asyncio.IncompleteReadError:
+            return None
+        return pickle.loads(body)
+
+    async def request(self, params: dict, snapshot: RenderSnapshot | None = None) -> dict | None:
+        job = dict(params)
+        if snapshot is not None:
+            if snapshot.version in self.snapshots:
+                # 保持済みならversionだけを送る
+                job['snapshot_version'] = snapshot.version
+            else:
+                job['snapshot'] = snapshot.to_payload()
+        result = await self._exchange(job)
+        if result is not None and result.get('missing_snapshot') and snapshot is not None:
+            self.snapshots.clear()
+            job.pop('snapshot_version', None)
+            job['snapshot'] = snapshot.to_payload()
+            result = await self._exchange(job)
+        if result is not None and 'snapshot' in job:
+            self.snapshots.append(snapshot.version)
+        return result
+
+    def kill(self):
+        """応答しないワーカーを強制終了する"""
+        if self.is_alive():
+            try:
+                self.proc.kill()
+            except ProcessLookupError:
+                pass
+
+    async def stop(self):
+        if not self.is_alive():
+            return
+        try:
+            self.proc.stdin.close()
+            await asyncio.wait_for(self.proc.wait(), timeout=5)
+        except Exception:
+            self.kill()
+            await self.proc.wait()
+
+
+class MapWorkerPool:
+    """
+    マップ描画用の常駐ワーカープール。
+    ワーカーは起動時にMapRendererとベースマップを読み込み済みの状態で待機し、
+    ジョブごとのプロセス起動・アセット再読込を省く。
+    描画はイベントループを止めずに非同期で待ち、タイムアウトやキャンセル時は
+    処理中のワーカーを強制終了して作り直す。
+    """
+    def __init__(self, size: int = 1, max_jobs_per_worker: int = 50, default_timeout: float = 60.0):
+        self.size = max(1, size)
+        # メモリ断片化対策として一定ジョブ数ごとにワーカーを作り直す
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.default_timeout = default_timeout
+        self._idle: asyncio.Queue[_MapWorker] | None = None
+        self._next_id = 0
+        self._snapshot: RenderSnapshot | None = None
+        self._closed = False
+        self._missing = 0  # 起動に失敗して欠けているワーカー数（次のrenderで起動し直す）
+
+    async def _spawn(self) -> _MapWorker:
+        self._next_id += 1
+        worker = await _MapWorker.spawn(self._next_id)
+        logger.info(f"[MapWorkerPool] ワーカー#{worker.worker_id} (pid={worker.proc.pid}) を起動しました")
+        return worker
+
+    async def _try_spawn(self) -> _MapWorker | None:
+        try:
+            return await self._spawn()
+        except Exception as e:
+            logger.error(f"[MapWorkerPool] ワーカーの起動に失敗しました: {e}")
+            return None
+
+    async def _replenish(self):
+        """起動に失敗して欠けたワーカーを起動し直す"""
+        while self._missing > 0 and not self._closed:
+            self._missing -= 1
+            worker = await self._try_spawn()
+            if worker is None:
+                self._missing += 1
+                return
+            self._idle.put_nowait(worker)
+
+    async def start(self):
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        self._missing = self.size
+        await self._replenish()
+
+    async def _release(self, worker: _MapWorker, healthy: bool):
+        if self._closed:
+            await worker.stop()
+            return
+        if not healthy or not worker.is_alive():
+            worker.kill()
+            await worker.proc.wait()
+            worker = await self._try_spawn()
+        elif worker.jobs_done >= self.max_jobs_per_worker:
+            await worker.stop()
+            worker = await self._try_spawn()
+        if worker is None:
+            # 枠は失わず、次のrenderで起動し直す
+            self._missing += 1
+            return
+        self._idle.put_nowait(worker)
+
+    def snapshot_for(self, territory_data: dict, guild_color_map: dict | None) -> RenderSnapshot:
+        """
+        データが前回と同じなら同じversionのスナップショットを返し、変わっていれば新しいversionを振る。
+        guild_color_mapがNone（カラーを一度も取得できていない）なら現在のスナップショットのカラーを引き継ぐ。
+        """
+        if guild_color_map is None:
+            guild_color_map = self._snapshot.guild_color_map if self._snapshot else {}
+        if self._snapshot is None or not self._snapshot.matches(territory_data, guild_color_map):
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            self._snapshot = RenderSnapshot(version, territory_data, guild_color_map)
+        return self._snapshot
+
+    async def render(self, params: dict, snapshot: RenderSnapshot | None = None, timeout: float | None = None) -> dict:
+        """
+        空きワーカーにジョブを渡し、結果の辞書を返す（失敗・タイムアウト時は空辞書）。
+        snapshotを渡すと、ワーカーが保持していない場合だけ領地データ本体を送る。
+        呼び出し元がキャンセルされた場合は処理中のワーカーを終了させてから伝播する。
+        """
+        if self._closed:
+            return {}
+        await self.start()
+        await self._replenish()
+        if self._missing >= self.size:
+            logger.error("[MapWorkerPool] 起動しているワーカーがないため描画できません")
+            return {}
+        timeout = self.default_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        try:
+            worker = await asyncio.wait_for(self._idle.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[MapWorkerPool] 空きワーカー待ちが{timeout:.0f}秒を超えました")
+            return {}
+
+        healthy = False
+        try:
+            result = await asyncio.wait_for(worker.request(params, snapshot), timeout=max(0.0, deadline - loop.time()))
+            worker.jobs_done += 1
+            if result is None:
+                logger.error(f"[MapWorkerPool] ワーカー#{worker.worker_id} が応答せず終了しました")
+                return {}
+            healthy = True
+            return result
+        except asyncio.TimeoutError:
+            logger.warning(f"[MapWorkerPool] ワーカー#{worker.worker_id} がタイムアウトしたため強制終了します")
+            return {}
+        except asyncio.CancelledError:
+            logger.warning(f"[MapWorkerPool] ジョブがキャンセルされたためワーカー#{worker.worker_id} を終了します")
+            raise
+        except Exception as e:
+            logger.error(f"[MapWorkerPool] ワーカー#{worker.worker_id} との通信に失敗: {e}")
+            return {}
+        finally:
+            if not healthy:
+                # 入出力の途中で止まったワーカーは状態が不定なので即座に落とす
+                worker.kill()
+            await asyncio.shield(self._release(worker, healthy))
+
+    async def close(self):
+        self._closed = True
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            await worker.stop()
@@ -0,0 +1,147 @@
+from typing import Any
+
+# プロフィールカードに載せるレイド
+PROFILE_RAIDS = (
+    "Nest of the Grootslangs",
+    "Orphion's Nexus of Light",
+    "The Canyon Colossus",
+    "The Nameless Anomaly",
+)
+
+def _dig(d, *keys):
+    """入れ子のdictを辿る。途中で欠けていればNone"""
+    v = d
+    for k in keys:
+        if not isinstance(v, dict):
+            return None
+        v = v.get(k)
+    return v
+
+
+class _Projection:
+    """
+    API応答から描画に使う項目だけを抜き出したモデルの基底。
+    キャッシュには to_dict() の結果（項目名 -> 値の平たいdict）を保存し、from_dict() で戻す。
+    """
+    __slots__ = ()
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        obj = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(obj, name, d.get(name))
+        return obj
+
+
+class PlayerSummary(_Projection):
+    """
+    /v3/player/<name>?fullResult からプロフィールカード(build_profile_info)に要る項目だけを持つ。
+    値が応答になかった項目はNoneのまま持ち、表示時の既定値は描画側で決める。
+    """
+    __slots__ = (
+        "username", "uuid", "support_rank", "first_join", "last_join",
+        "guild_name", "guild_prefix", "guild_rank", "online", "server",
+        "has_active_character", "character_type", "character_reskin",
+        "playtime", "mobs_killed", "wars", "completed_quests", "world_events",
+        "total_level", "chests_found", "pvp_kills", "pvp_deaths",
+        "dungeons_total", "raids_total", "raid_completions",
+        "has_ranking", "wars_completion_rank",
+    )
+
+    @classmethod
+    def from_api(cls, data: dict[str, Any]) -> "PlayerSummary":
+        obj = cls.__new__(cls)
+        obj.username = data.get("username")
+        obj.uuid = data.get("uuid")
+        obj.support_rank = data.get("supportRank")
+        obj.first_join = data.get("firstJoin")
+        obj.last_join = data.get("lastJoin")
+        obj.guild_name = _dig(data, "guild", "name")
+        obj.guild_prefix = _dig(data, "guild", "prefix")
+        obj.guild_rank = _dig(data, "guild", "rank")
+        obj.online = data.get("online")
+        obj.server = data.get("server")
+
+        active = data.get("activeCharacter")
+        obj.has_active_character = active is not None
+        character = _dig(data, "characters", active) if active is not None else None
+        obj.character_type = _dig(character, "type")
+        obj.character_reskin = _dig(character, "reskin")
+
+        obj.playtime = data.get("playtime")
+        obj.mobs_killed = _dig(data, "globalData", "mobsKilled")
+        obj.wars = _dig(data, "globalData", "wars")
+        obj.completed_quests = _dig(data, "globalData", "completedQuests")
+        obj.world_events = _dig(data, "globalData", "worldEvents")
+        obj.total_level = _dig(data, "globalData", "totalLevel")
+        obj.chests_found = _dig(data, "globalData", "chestsFound")
+        obj.pvp_kills = _dig(data, "globalData", "pvp", "kills")
+        obj.pvp_deaths = _dig(data, "globalData", "pvp", "deaths")
+        obj.dungeons_total = _dig(data, "globalData", "dungeons", "total")
+        obj.raids_total = _dig(data, "globalData", "raids", "total")
+        # レイド一覧が取れなかった(非公開など)ときはNone、取れたときはカードに載せる分だけ
+        raid_list = _dig(data, "globalData", "raids", "list")
+        obj.raid_completions = {k: raid_list[k] for k in PROFILE_RAIDS if k in raid_list} if isinstance(raid_list, dict) else None
+
+        ranking = data.get("ranking")
+        obj.has_ranking = ranking is not None
+        obj.wars_completion_rank = _dig(ranking, "warsCompletion")
+        return obj
+
+
+class GuildSummary(_Projection):
+    """
+    /v3/guild/... からギルドカード(create_guild_image)に要る項目だけを持つ。
+    メンバー一覧はオンラインのメンバー (名前, サーバー, ランク) だけに絞る。
+    """
+    __slots__ = (
+        "uuid", "name", "prefix", "level", "xp_percent", "wars", "territories",
+        "created", "owner", "total_members", "online_members",
+        "latest_season", "season_rating", "banner",
+    )
+
+    @classmethod
+    def from_api(cls, data: dict[str, Any]) -> "GuildSummary":
+        def value(key, default):
+            v = data.get(key)
+            return default if v is None else v
+
+        obj = cls.__new__(cls)
+        obj.uuid = data.get("uuid")
+        obj.name = value("name", "Unknown Guild")
+        obj.prefix = value("prefix", "")
+        obj.level = value("level", 0)
+        obj.xp_percent = value("xpPercent", 0)
+        obj.wars = value("wars", 0)
+        obj.territories = value("territories", 0)
+        created = value("created", "N/A")
+        obj.created = created.split("T")[0] if isinstance(created, str) and "T" in created else created
+        obj.banner = data.get("banner")
+
+        members = data.get("members") or {}
+        owners = members.get("owner") or {}
+        obj.owner = next(iter(owners), "N/A") if isinstance(owners, dict) else "N/A"
+        total = members.get("total")
+        obj.total_members = 0 if total is None else total
+        online = []
+        for rank_name, rank_group in members.items():
+            if not isinstance(rank_group, dict):
+                continue
+            for player_name, payload in rank_group.items():
+                if isinstance(payload, dict) and payload.get("online"):
+                    online.append((player_name, payload.get("server", "N/A"), rank_name.upper()))
+        obj.online_members = online
+
+        obj.latest_season = "N/A"
+        obj.season_rating = "N/A"
+        season_ranks = data.get("seasonRanks") or {}
+        if isinstance(season_ranks, dict) and season_ranks:
+            try:
+                obj.latest_season = str(max(int(k) for k in season_ranks.keys()))
+                obj.season_rating = season_ranks.get(obj.latest_season, {}).get("rating", "N/A")
+            except Exception:
+                obj.latest_season = "N/A"
+        return obj
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# リクエストの優先度（小さいほど先にトークンを受け取る）
+PRIORITY_INTERACTIVE = 0  # ユーザーのコマンド
+PRIORITY_BACKGROUND = 1   # 定期クロールなど
+# 対話側の需要を数える期間（秒）
+INTERACTIVE_DEMAND_WINDOW = 10.0
+
+def _header_number(headers, name: str) -> float | None:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_retry_after(headers) -> float | None:
+    """429応答の待ち秒数を Retry-After（秒またはHTTP日付）か RateLimit-Reset から求める"""
+    value = headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    return _header_number(headers, "RateLimit-Reset")
+
+
+class RateLimiter:
+    """
+    トークンバケット方式の非同期レートリミッター（同じAPIトークンを使う全呼び出しで共有する）。
+    通常は limit / window のペースで補充し、バケットの容量(burst)までしか溜めない。
+    応答のRateLimit-*ヘッダーを受け取ったら、残数をリセットまでの時間で均等に払い出すよう
+    補充ペースを合わせ直すので、窓の途中で使い切って429になることがない。
+    待機中の呼び出しは優先度順（同じ優先度なら到着順）に1つずつトークンを受け取る。
+    バックグラウンドの呼び出しはバケットに一定数を残した状態でしか取れず、
+    直近に対話側のリクエストが多いほど残す数を増やして引き下がる。
+    429を受けたら throttle() で指定時間すべての払い出しを止め、その後自動で再開する。
+    """
+    def __init__(self, name: str, limit: int, window: float = 60.0, burst: int | None = None, background_reserve: int = 2):
+        self.name = name
+        self.window = window
+        self.limit = max(1, limit)
+        self._burst_setting = burst  # 指定がなければ上限から求め、上限が変わったら求め直す
+        self.burst = self._burst_for(self.limit)
+        self._tokens = float(self.burst)
+        self._rate = self.limit / self.window
+        self._updated = time.monotonic()
+        self._reset_at = 0.0  # ヘッダーで知らされた窓のリセット時刻（0なら未知）
+        self.background_reserve = background_reserve
+        self._waiters: list[tuple[int, int]] = []  # (優先度, 到着順) のヒープ
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._interactive_times: deque[float] = deque()
+        self._blocked_until = 0.0  # 429で止めている間はこの時刻まで払い出さない
+        # 計測値（stats()で参照）
+        self.throttled_count = 0
+        self.throttled_seconds = 0.0
+        self._wait_seconds = {PRIORITY_INTERACTIVE: 0.0, PRIORITY_BACKGROUND: 0.0}
+        self._acquired = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+
+    def _burst_for(self, limit: int) -> int:
+        return min(limit, self._burst_setting or max(1, limit // 6))
+
+    def _advance(self, until: float):
+        elapsed = until - self._updated
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self._rate)
+            self._updated = until
+
+    def _refill(self, now: float):
+        if self._reset_at and now >= self._reset_at:
+            # リセット時刻までは残数に合わせたペース、以降は通常ペースで補充する
+            self._advance(self._reset_at)
+            self._rate = self.limit / self.window
+            self._reset_at = 0.0
+        self._advance(now)
+
+    def _prune_interactive(self, now: float):
+        """需要を数える期間を過ぎた対話側のリクエストを捨てる"""
+        while self._interactive_times and now - self._interactive_times[0] > INTERACTIVE_DEMAND_WINDOW:
+            self._interactive_times.popleft()
+
+    def _required_tokens(self, priority: int, now: float) -> float:
+        """この優先度の呼び出しがトークンを取るためにバケットに必要な数"""
+        if priority <= PRIORITY_INTERACTIVE:
+            return 1.0
+        self._prune_interactive(now)
+        # 直近の対話側リクエスト数だけ余分に残す（満杯なら必ず取れるよう容量-1まで）
+        reserve = min(self.burst - 1, self.background_reserve + len(self._interactive_times))
+        return 1.0 + max(0, reserve)
+
+    def _wait_time(self, now: float, required: float = 1.0) -> float:
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= required:
+            return 0.0
+        wait = (required - self._tokens) / self._rate if self._rate > 0 else self.window
+        if self._reset_at:
+            wait = min(wait, self._reset_at - now)
+        return max(wait, 0.001)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        """トークンを1つ取得する（足りなければ補充まで待つ）"""
+        entry = (priority, next(self._seq))
+        started = time.monotonic()
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            if self._waiters[0] == entry and len(self._waiters) > 1:
+                # 先頭を追い越したので、補充待ちしている元の先頭を起こして順番を譲らせる
+                self._cond.notify_all()
+            if priority <= PRIORITY_INTERACTIVE:
+                # バックグラウンド側が来ない間も溜め込まないよう、記録のたびに古いものを捨てる
+                now = time.monotonic()
+                self._prune_interactive(now)
+                self._interactive_times.append(now)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiters[0] != entry:
+                        # 先頭ではない間は順番が回ってくるまで待つ
+                        await self._cond.wait()
+                        continue
+                    self._refill(now)
+                    required = self._required_tokens(priority, now)
+                    if now >= self._blocked_until and self._tokens >= required:
+                        self._tokens -= 1
+                        self._acquired[priority] = self._acquired.get(priority, 0) + 1
+                        self._wait_seconds[priority] = self._wait_seconds.get(priority, 0.0) + (now - started)
+                        return
+                    try:
+                        # 待機中に優先度の高い呼び出しが来たら起こされる
+                        await asyncio.wait_for(self._cond.wait(), timeout=self._wait_time(now, required))
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def throttle(self, seconds: float):
+        """429を受けたとき、seconds秒間すべての払い出しを止める"""
+        now = time.monotonic()
+        until = now + max(0.0, seconds)
+        self.throttled_count += 1
+        self.throttled_seconds += max(0.0, until - max(now, self._blocked_until))
+        self._blocked_until = max(self._blocked_until, until)
+        self._refill(now)
+        self._tokens = 0.0
+        logger.warning(f"[RateLimiter:{self.name}] 429を受けたため{seconds:.1f}秒間リクエストを止めます (累計 {self.throttled_count}回 / {self.throttled_seconds:.1f}秒)")
+
+    def stats(self) -> dict:
+        """スロットリング・待ち時間の計測値を返す"""
+        return {
+            "throttled_count": self.throttled_count,
+            "throttled_seconds": round(self.throttled_seconds, 1),
+            "acquired": dict(self._acquired),
+            "wait_seconds": {p: round(v, 1) for p, v in self._wait_seconds.items()},
+        }
+
+    def update_from_headers(self, headers):
+        """RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset(秒) を反映する"""
+        limit = _header_number(headers, "RateLimit-Limit")
+        remaining = _header_number(headers, "RateLimit-Remaining")
+        reset = _header_number(headers, "RateLimit-Reset")
+        now = time.monotonic()
+        self._refill(now)
+        if limit and int(limit) != self.limit:
+            logger.info(f"[RateLimiter:{self.name}] 上限を{self.limit}から{int(limit)}に更新します")
+            self.limit = int(limit)
+            # 容量も新しい上限に合わせ、下げられた場合は溜まっている分も切り詰める
+            self.burst = self._burst_for(self.limit)
+            self._tokens = min(self._tokens, float(self.burst))
+            if not self._reset_at:
+                self._rate = self.limit / self.window
+        if remaining is None:
+            return
+        # 手元の見積もりより少なければサーバー側に合わせる（遅れて届いた応答で増やすことはしない）
+        self._tokens = min(self._tokens, max(0.0, remaining))
+        if reset is not None and reset > 0:
+            # バケットに残っている分を除いた残数を、リセットまでの時間で均等に払い出す
+            self._reset_at = now + reset
+            self._rate = max(0.0, remaining - self._tokens) / reset
@@ -0,0 +1,201 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Any, Callable, Hashable, Iterable
+
+# 単語の先頭とみなす位置（空白・ハイフン・括弧などの直後）
+_WORD_START = re.compile(r"(?<=[\s\-'(])[^\s\-'(]")
+
+# 一致の種類。小さいほど上位に並べる
+TIER_PREFIX = 0       # 全体の先頭から一致
+TIER_WORD_PREFIX = 1  # 途中の単語の先頭から一致
+TIER_SUBSTRING = 2    # それ以外の部分一致
+TIER_FUZZY = 3        # 一致はしないが綴りが近い（打ち間違い）
+
+# 打ち間違いの候補にするのに、queryのn-gramのうち共有していなければならない割合と個数
+# （短いqueryは1文字の入れ替えでn-gramの大半が崩れるので、1つ共有していれば候補にする）
+FUZZY_MIN_SHARED_RATIO = 0.4
+FUZZY_MIN_SHARED = 2
+FUZZY_SHORT_QUERY = 6
+# 候補のうち、queryとの類似度（SequenceMatcher.ratio）がこれ以上のものだけを打ち間違いとして返す
+FUZZY_MIN_RATIO = 0.7
+# 類似度を計算する候補の数（返す件数の何倍か）。共有するn-gramが多い順に取る
+FUZZY_POOL_FACTOR = 4
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class SearchIndex:
+    """
+    オートコンプリート用のメモリ内検索インデックス。
+    小文字化したキーと単語ごとの接尾辞をソート済み配列に持ち、二分探索で接頭辞一致を引く
+    （接頭辞トライと同じ範囲検索を配列1本で行う）。
+    部分一致はn-gramの転置リストで候補を絞ってから確認し、
+    それでも足りなければ共有するn-gramの数で打ち間違いを拾う。
+    1つの値に複数のキー（ギルド名とprefixなど）を登録できる。
+    remove()した値は削除済みとして印を付け、一定数たまったら作り直す。
+    """
+    def __init__(self, ngram_size: int = 3):
+        self.ngram_size = ngram_size
+        self._values: list = []
+        self._value_ids: dict[Hashable, int] = {}
+        self._keys: list[tuple[str, int]] = []       # キーID -> (正規化済みキー, 値ID)
+        self._prefixes: list[tuple[str, int, int]] = []  # (キーまたは単語以降, 一致の種類, キーID) をソートして保持
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        self._removed: set[int] = set()
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self._value_ids)
+
+    def __contains__(self, value) -> bool:
+        return value in self._value_ids
+
+    @classmethod
+    def build(cls, entries: Iterable[tuple[str, Any]], ngram_size: int = 3) -> "SearchIndex":
+        """(キー, 値) の組からインデックスを作る"""
+        index = cls(ngram_size)
+        for key, value in entries:
+            index.add(key, value)
+        return index
+
+    def add(self, key: str, value: Any):
+        text = normalize_text(key)
+        if not text:
+            return
+        value_id = self._value_ids.get(value)
+        if value_id is None:
+            value_id = len(self._values)
+            self._values.append(value)
+            self._value_ids[value] = value_id
+        key_id = len(self._keys)
+        self._keys.append((text, value_id))
+        self._prefixes.append((text, TIER_PREFIX, key_id))
+        for m in _WORD_START.finditer(text):
+            self._prefixes.append((text[m.start():], TIER_WORD_PREFIX, key_id))
+        n = self.ngram_size
+        for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+            self._postings[gram].append(key_id)
+        self._sorted = False
+
+    def remove(self, value: Any):
+        """値とそのキーを検索対象から外す"""
+        value_id = self._value_ids.pop(value, None)
+        if value_id is None:
+            return
+        self._removed.add(value_id)
+        if len(self._removed) > len(self._value_ids) // 4 + 64:
+            self._compact()
+
+    def _compact(self):
+        live = [(text, self._values[value_id]) for text, value_id in self._keys if value_id not in self._removed]
+        self.__init__(self.ngram_size)
+        for text, value in live:
+            self.add(text, value)
+
+    def _substring_candidates(self, query: str) -> Iterable[int]:
+        n = self.ngram_size
+        if len(query) < n:
+            return range(len(self._keys))
+        grams = sorted({query[i:i + n] for i in range(len(query) - n + 1)}, key=lambda g: len(self._postings.get(g, ())))
+        candidates = set(self._postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(self._postings.get(gram, ()))
+        return candidates
+
+    def _fuzzy_candidates(self, query: str, pool: int, usable: Callable[[int], bool]) -> list[tuple[int, float]]:
+        """
+        queryとn-gramを共有するキーのうち、共有数の多い pool 件を候補に取り、
+        綴りの近さで絞って (キーID, 類似度) で返す。usable(キーID) がFalseのキーは候補にしない。
+        キーはqueryと同じくらいの長さの先頭部分とも比べ、入力途中の打ち間違いも拾う。
+        """
+        n = self.ngram_size
+        grams = {query[i:i + n] for i in range(len(query) - n + 1)}
+        if not grams:
+            return []
+        if len(query) <= FUZZY_SHORT_QUERY:
+            need = 1
+        else:
+            need = max(FUZZY_MIN_SHARED, math.ceil(len(grams) * FUZZY_MIN_SHARED_RATIO))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        candidates = heapq.nlargest(
+            pool,
+            (item for item in shared.items() if item[1] >= need and usable(item[0])),
+            key=lambda item: item[1],
+        )
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(query)
+        results = []
+        for key_id, _ in candidates:
+            text = self._keys[key_id][0]
+            ratio = 0.0
+            for target in {text, text[:len(query)], text[:len(query) + 1]}:
+                matcher.set_seq1(target)
+                if matcher.real_quick_ratio() >= FUZZY_MIN_RATIO and matcher.quick_ratio() >= FUZZY_MIN_RATIO:
+                    ratio = max(ratio, matcher.ratio())
+            if ratio >= FUZZY_MIN_RATIO:
+                results.append((key_id, ratio))
+        return results
+
+    def search(self, query: str, limit: int = 25, accept: Callable[[Any], bool] | None = None) -> list:
+        """
+        queryに一致する値を返す。
+        先頭一致 → 単語の先頭一致 → 部分一致 → 打ち間違い の順に並べ、同じ種類の中では短いキーを優先する
+        （打ち間違いは綴りが近いものを先にする）。
+        acceptを渡すと、それがTrueを返す値だけを返す（limit件はその中から数える）。
+        打ち間違いの検索は、それより前の種類で limit 件に届かなかったときだけ行う。
+        """
+        rejected: set[int] = set()
+
+        def usable_value(value_id: int) -> bool:
+            if value_id in self._removed or value_id in rejected:
+                return False
+            if accept is not None and not accept(self._values[value_id]):
+                rejected.add(value_id)
+                return False
+            return True
+
+        q = normalize_text(query)
+        if not q:
+            return [value for value_id, value in enumerate(self._values) if usable_value(value_id)][:limit]
+        if not self._sorted:
+            self._prefixes.sort()
+            self._sorted = True
+
+        best: dict[int, tuple] = {}
+
+        def record(key_id: int, tier: int, score: float = 0):
+            text, value_id = self._keys[key_id]
+            if not usable_value(value_id):
+                return
+            rank = (tier, -score, len(text), text)
+            if value_id not in best or rank < best[value_id]:
+                best[value_id] = rank
+
+        i = bisect_left(self._prefixes, (q,))
+        while i < len(self._prefixes) and self._prefixes[i][0].startswith(q):
+            _, tier, key_id = self._prefixes[i]
+            record(key_id, tier)
+            i += 1
+        if len(best) < limit:
+            for key_id in self._substring_candidates(q):
+                if self._keys[key_id][1] not in best and q in self._keys[key_id][0]:
+                    record(key_id, TIER_SUBSTRING)
+        if len(best) < limit:
+            def usable_key(key_id: int) -> bool:
+                value_id = self._keys[key_id][1]
+                return value_id not in best and usable_value(value_id)
+
+            for key_id, ratio in self._fuzzy_candidates(q, limit * FUZZY_POOL_FACTOR, usable_key):
+                record(key_id, TIER_FUZZY, ratio)
+
+        ranked = sorted(best, key=best.__getitem__)
+        return [self._values[value_id] for value_id in ranked[:limit]]
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    同じキーで同時に走る処理を1回にまとめ、結果を待っている全員で共有する。
+    完了した時点でキーは解放されるので、結果のキャッシュは行わない。
+    待機者が全員キャンセルされた場合のみ、実行中の処理もキャンセルする。
+    """
+    def __init__(self, name: str = "SingleFlight"):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[Hashable, int] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _t, k=key: self._forget(k, _t))
+        else:
+            logger.info(f"[{self.name}] 実行中の同一リクエストに相乗りします: {key}")
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1:
+                task.cancel()
+            raise
+        finally:
+            if key in self._waiters and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
@@ -1,21 +1,46 @@
 import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import pickle
 import ctypes
+import logging
+import select
+from logger_setup import setup_logger
 from lib.map_renderer import MapRenderer
+from collections import OrderedDict
+from lib.map_worker_pool import read_frame, write_frame, WORKER_SNAPSHOT_SLOTS, WORKER_IDLE_RELEASE_SECONDS
 
-def main():
-    params = pickle.load(sys.stdin.buffer)
-    renderer = MapRenderer()
+logger = logging.getLogger(__name__)
+
+def resolve_snapshot(snapshots: OrderedDict, params: dict) -> tuple | None:
+    """ジョブのスナップショットを取り出す（新規受信分は保持し、古いものから捨てる）"""
+    payload = params.get('snapshot')
+    if payload is not None:
+        snapshots[payload['version']] = (payload['territory_data'], payload['guild_color_map'])
+        while len(snapshots) > WORKER_SNAPSHOT_SLOTS:
+            snapshots.popitem(last=False)
+        return snapshots[payload['version']]
+    return snapshots.get(params.get('snapshot_version'))
+
+def trim_memory():
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except Exception:
+        pass
+
+def handle_job(renderer: MapRenderer, params: dict, territory_data: dict, guild_color_map: dict) -> dict:
     mode = params.get("mode", "map")
 
     result = {}
     if mode == "map":
+        names = params.get('territory_names')
+        if names is None:
+            territories_to_render = territory_data
+        else:
+            territories_to_render = {name: territory_data[name] for name in names if name in territory_data}
         file, embed = renderer.create_territory_map(
-            territory_data=params['territory_data'],
-            territories_to_render=params['territories_to_render'],
-            guild_color_map=params['guild_color_map'],
+            territory_data=territory_data,
+            territories_to_render=territories_to_render,
+            guild_color_map=guild_color_map,
             show_held_time=params.get('show_held_time', False)
         )
         map_bytes = None
@@ -30,8 +55,8 @@ def main():
     elif mode == "single":
         image_bytes = renderer.create_single_territory_image(
             params['territory'],
-            params['territory_data'],
-            params['guild_color_map'],
+            territory_data,
+            guild_color_map,
         )
         img_bytes = None
         if image_bytes:
@@ -41,12 +66,49 @@ def main():
         result = {
             'image_bytes': img_bytes,
         }
-    pickle.dump(result, sys.stdout.buffer)
+    return result
 
-    try:
-        ctypes.CDLL('libc.so.6').malloc_trim(0)
-    except Exception:
-        pass
+def main():
+    # プロトコル用にstdoutを確保し、以降の標準出力はstderrへ逃がす
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    # selectで待ち時間を測るため、先読みしない生のstdinから読む
+    inp = sys.stdin.buffer.raw
+    setup_logger()
+
+    # アセットを先に読み込んでおき、最初のジョブから温まった状態で描画する
+    renderer = MapRenderer()
+    renderer.preload()
+    snapshots = OrderedDict()
+    released = True
+
+    while True:
+        if not released:
+            ready, _, _ = select.select([inp], [], [], WORKER_IDLE_RELEASE_SECONDS)
+            if not ready:
+                # しばらく暇なら差分描画用のマップ・交易路レイヤーを手放す
+                renderer.release_render_caches()
+                trim_memory()
+                released = True
+                logger.info("[MapWorker] 待機が続いたため描画キャッシュを解放しました")
+                continue
+        params = read_frame(inp)
+        if params is None:
+            break
+        snapshot = resolve_snapshot(snapshots, params)
+        if snapshot is None:
+            # 保持していないversionを指定された場合は本体の再送を求める
+            write_frame(out, {'missing_snapshot': True})
+            continue
+        try:
+            result = handle_job(renderer, params, *snapshot)
+        except Exception as e:
+            logger.error(f"[MapWorker] ジョブ処理中にエラー: {e}", exc_info=True)
+            result = {}
+        write_frame(out, result)
+        released = False
+
+        trim_memory()
 
 if __name__ == "__main__":
     main()
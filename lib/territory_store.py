@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import marshal
+import logging
+from array import array
+
+from lib.search_index import SearchIndex
+from lib.utils import atomic_write_bytes, source_file_tag
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERRITORIES_JSON_PATH = os.path.join(project_root, "assets", "map", "territories.json")
+TERRITORY_STORE_CACHE_DIR = os.path.join(project_root, "cache", "map")
+
+# ゲーム内座標 → マップ画像(元サイズ)のピクセル座標へのオフセット
+MAP_ORIGIN_OFFSET = (2560, 6632)
+# 資源の並び（territories.jsonの記載順）
+RESOURCE_KEYS = ("emeralds", "ore", "crops", "fish", "wood")
+
+# 変換済みバイナリの形式。配列のレイアウトを変えたら上げる
+_STORE_FORMAT = "ETKWTER1"
+
+def coord_to_pixel(x: int, z: int) -> tuple[int, int]:
+    return x + MAP_ORIGIN_OFFSET[0], z + MAP_ORIGIN_OFFSET[1]
+
+
+class TerritoryStore:
+    """
+    territories.jsonの静的データを配列に詰めた読み取り専用ストア。
+    領地はインデックスで扱い、矩形・中心・資源・交易路をarrayに平たく持つ。
+    交易路は隣接リストをoffsets/targetsの2本の配列で表す。
+    """
+    __slots__ = (
+        "names", "index", "rects", "centers", "resources",
+        "route_offsets", "route_targets", "_scaled_rects", "_route_edges", "_search_index"
+    )
+
+    def __init__(self, names, rects: array, centers: array, resources: array, route_offsets: array, route_targets: array):
+        self.names = tuple(sys.intern(name) for name in names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.rects = rects                  # 元サイズのピクセル座標 (x_min, y_min, x_max, y_max) × 領地数
+        self.centers = centers              # 交易路の端点 (x, y) × 領地数
+        self.resources = resources          # RESOURCE_KEYSの順で時間あたり産出量 × 領地数
+        self.route_offsets = route_offsets  # 領地iの交易路は route_targets[offsets[i]:offsets[i+1]]
+        self.route_targets = route_targets
+        self._scaled_rects = None
+        self._route_edges = None
+        self._search_index = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self.index
+
+    @classmethod
+    def from_json(cls, data: dict) -> "TerritoryStore":
+        names = [name for name, static in data.items() if "Location" in static]
+        index = {name: i for i, name in enumerate(names)}
+        rects, centers, resources = array("i"), array("i"), array("i")
+        route_offsets, route_targets = array("i", [0]), array("i")
+        for name in names:
+            static = data[name]
+            (sx, sz), (ex, ez) = static["Location"]["start"], static["Location"]["end"]
+            px1, py1 = coord_to_pixel(sx, sz)
+            px2, py2 = coord_to_pixel(ex, ez)
+            rects.extend((min(px1, px2), min(py1, py2), max(px1, px2), max(py1, py2)))
+            centers.extend(coord_to_pixel((sx + ex) // 2, (sz + ez) // 2))
+            res = static.get("resources", {})
+            resources.extend(int(res.get(key, 0) or 0) for key in RESOURCE_KEYS)
+            route_targets.extend(index[dest] for dest in static.get("Trading Routes", []) if dest in index)
+            route_offsets.append(len(route_targets))
+        return cls(names, rects, centers, resources, route_offsets, route_targets)
+
+    def to_bytes(self) -> bytes:
+        return marshal.dumps((
+            _STORE_FORMAT,
+            self.names,
+            self.rects.tobytes(),
+            self.centers.tobytes(),
+            self.resources.tobytes(),
+            self.route_offsets.tobytes(),
+            self.route_targets.tobytes(),
+        ))
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "TerritoryStore":
+        fmt, names, *blobs = marshal.loads(payload)
+        if fmt != _STORE_FORMAT:
+            raise ValueError(f"形式が異なります: {fmt}")
+        rects, centers, resources, route_offsets, route_targets = (array("i", blob) for blob in blobs)
+        n = len(names)
+        if len(rects) != n * 4 or len(centers) != n * 2 or len(resources) != n * len(RESOURCE_KEYS) or len(route_offsets) != n + 1:
+            raise ValueError("配列の長さが領地数と一致しません")
+        return cls(names, rects, centers, resources, route_offsets, route_targets)
+
+    def rect(self, i: int) -> tuple:
+        return tuple(self.rects[i * 4:i * 4 + 4])
+
+    def scaled_rects(self, scale: float) -> array:
+        """縮尺を掛けた矩形の配列を返す（直近の縮尺1つ分を保持）"""
+        if self._scaled_rects is None or self._scaled_rects[0] != scale:
+            self._scaled_rects = (scale, array("d", (v * scale for v in self.rects)))
+        return self._scaled_rects[1]
+
+    def location(self, name: str) -> dict | None:
+        """APIの "location" と同じ形式（ゲーム内座標）で矩形を返す"""
+        i = self.index.get(name)
+        if i is None:
+            return None
+        x1, y1, x2, y2 = self.rect(i)
+        ox, oz = MAP_ORIGIN_OFFSET
+        return {"start": [x1 - ox, y1 - oz], "end": [x2 - ox, y2 - oz]}
+
+    def resources_of(self, name: str) -> dict:
+        i = self.index.get(name)
+        if i is None:
+            return {}
+        k = len(RESOURCE_KEYS)
+        return dict(zip(RESOURCE_KEYS, self.resources[i * k:i * k + k]))
+
+    def routes_of(self, name: str) -> list[str]:
+        i = self.index.get(name)
+        if i is None:
+            return []
+        return [self.names[j] for j in self.route_targets[self.route_offsets[i]:self.route_offsets[i + 1]]]
+
+    def route_count(self, name: str) -> int:
+        i = self.index.get(name)
+        if i is None:
+            return 0
+        return self.route_offsets[i + 1] - self.route_offsets[i]
+
+    def route_edges(self) -> list[tuple[int, int]]:
+        """交易路を重複なし(A-BとB-Aを1本)の領地インデックスのペアとして返す"""
+        if self._route_edges is None:
+            edges = []
+            seen = set()
+            for i in range(len(self.names)):
+                for j in self.route_targets[self.route_offsets[i]:self.route_offsets[i + 1]]:
+                    key = (i, j) if i < j else (j, i)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    edges.append((i, j))
+            self._route_edges = edges
+        return self._route_edges
+
+    def search_index(self) -> SearchIndex:
+        """領地名のオートコンプリート用インデックス（初回呼び出し時に作る）"""
+        if self._search_index is None:
+            self._search_index = SearchIndex.build((name, name) for name in self.names)
+        return self._search_index
+
+
+def _store_cache_path(json_path: str) -> str:
+    return os.path.join(TERRITORY_STORE_CACHE_DIR, f"territories_{source_file_tag(json_path)}.bin")
+
+def _write_store_cache(cache_path: str, store: TerritoryStore):
+    try:
+        os.makedirs(TERRITORY_STORE_CACHE_DIR, exist_ok=True)
+        atomic_write_bytes(cache_path, store.to_bytes())
+        for fname in os.listdir(TERRITORY_STORE_CACHE_DIR):
+            fpath = os.path.join(TERRITORY_STORE_CACHE_DIR, fname)
+            if fname.startswith("territories_") and fname.endswith(".bin") and fpath != cache_path:
+                os.remove(fpath)
+        logger.info(f"領地データの変換済みキャッシュを保存しました: {cache_path}")
+    except Exception as e:
+        logger.warning(f"領地データキャッシュの書き込みに失敗: {e}")
+
+def load_territory_store(json_path: str = TERRITORIES_JSON_PATH) -> TerritoryStore:
+    """変換済みバイナリがあればJSONを読まずに復元し、なければJSONから作って保存する"""
+    cache_path = _store_cache_path(json_path)
+    try:
+        with open(cache_path, "rb") as f:
+            return TerritoryStore.from_bytes(f.read())
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"領地データキャッシュが壊れているため作り直します: {e}")
+
+    with open(json_path, "r", encoding='utf-8') as f:
+        store = TerritoryStore.from_json(json.load(f))
+    _write_store_cache(cache_path, store)
+    return store
+
+_store: TerritoryStore | None = None
+
+def get_territory_store() -> TerritoryStore:
+    """プロセス内で共有する領地ストアを返す（初回のみ読み込む）"""
+    global _store
+    if _store is None:
+        _store = load_territory_store()
+    return _store
@@ -1,30 +1,28 @@
 import discord
-import json
 import logging
+import os
 import psutil
 
 logger = logging.getLogger(__name__)
 
-def load_json_from_file(filepath: str) -> dict | list | None:
-    """JSONファイルを安全に読み込む"""
+def atomic_write_bytes(path: str, payload: bytes):
+    """一時ファイルに書いてから置き換え、読み手が書きかけのファイルを見ないようにする（失敗時は一時ファイルを消して例外を送出）"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
-    except Exception as e:
-        logger.error(f"ファイル'{filepath}'の読み込みに失敗: {e}")
-        return None
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
-def save_json_to_file(filepath: str, data: dict | list):
-    """データをJSONファイルに安全に書き込む"""
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return True
-    except Exception as e:
-        logger.error(f"ファイル'{filepath}'への書き込みに失敗: {e}")
-        return False
+def source_file_tag(path: str) -> str:
+    """元ファイルのサイズと更新時刻から作るタグ。派生キャッシュのファイル名に含め、元ファイルの差し替え時に自動で作り直させる"""
+    st = os.stat(path)
+    return f"{st.st_size:x}_{st.st_mtime_ns:x}"
 
 def create_embed(description=None, title=None, color=discord.Color.blurple(), footer_text="Onyx_"):
     embed = discord.Embed(description=description, color=color)
@@ -10,6 +10,7 @@ import logging
 from keep_alive import keep_alive
 from logger_setup import setup_logger
 from lib.db import create_table
+from lib.http_client import HttpClient
 from lib.utils import create_embed
 
 # ロガーを最初にセットアップ
@@ -24,6 +25,7 @@ TOKEN = os.getenv('DISCORD_TOKEN')
 class MyBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix="!", intents=discord.Intents.all())
+        self.http_client = None  # 全Cog共有のHTTPクライアント（bot.httpはdiscord.pyが使用）
 
     async def setup_hook(self):
         """Botの非同期セットアップを管理する"""
@@ -33,6 +35,9 @@ class MyBot(commands.Bot):
         create_table()
         keep_alive()
 
+        # Cogより先に共有HTTPクライアントを用意する
+        self.http_client = HttpClient()
+
         # Cogsを読み込む
         for filename in os.listdir('./cogs'):
             if filename.endswith('.py'):
@@ -57,6 +62,11 @@ class MyBot(commands.Bot):
         except Exception as e:
             logger.error(f"[Onyx_] -> ❌ コマンドの同期に失敗しました: {e}")
 
+    async def close(self):
+        await super().close()
+        if self.http_client:
+            await self.http_client.close()
+
     async def on_ready(self):
         """Botの準備が完了したときに呼ばれるイベント"""
         logger.info("==================================================")
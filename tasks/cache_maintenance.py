@@ -0,0 +1,29 @@
+import logging
+from discord.ext import commands, tasks
+from lib.cache_handler import CacheHandler
+
+logger = logging.getLogger(__name__)
+
+class CacheMaintenance(commands.Cog):
+    """キャッシュディレクトリの定期掃除（期限切れの削除と容量上限の維持）"""
+    def __init__(self, bot):
+        self.bot = bot
+        self.cache = CacheHandler()
+        self.sweep_cache_task.start()
+
+    def cog_unload(self):
+        self.sweep_cache_task.cancel()
+
+    @tasks.loop(minutes=10)
+    async def sweep_cache_task(self):
+        try:
+            await self.cache.sweep()
+        except Exception as e:
+            logger.error(f"[CacheMaintenance] キャッシュの掃除に失敗: {e}", exc_info=True)
+
+    @sweep_cache_task.before_loop
+    async def before_sweep_cache(self):
+        await self.bot.wait_until_ready()
+
+async def setup(bot):
+    await bot.add_cog(CacheMaintenance(bot))
@@ -3,6 +3,8 @@ import logging
 from datetime import datetime, timedelta
 from discord.ext import commands, tasks
 from lib.api_stocker import WynncraftAPI
+from lib.rate_limiter import PRIORITY_BACKGROUND
+from lib.guild_directory import get_guild_directory
 from lib.db import (
     upsert_guild_seasonal_rating, get_conn, update_current_season, 
     get_current_season, is_season_completed
@@ -15,7 +17,6 @@ class SeasonalRatingSync(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.api = None
-        self.request_delay = 0.55  # 120req/min = 2req/sec、安全マージン含む（0.55秒間隔）
         self.max_requests_per_hour = 7000  # 120req/min * 60min - 安全マージン
         self.current_season = None  # キャッシュ用
         self.sync_seasonal_ratings_task.start()  # タスクを開始
@@ -23,8 +24,6 @@ class SeasonalRatingSync(commands.Cog):
     def cog_unload(self):
         """Cogがアンロードされる時の処理"""
         self.sync_seasonal_ratings_task.cancel()
-        if self.api:
-            asyncio.create_task(self.api.close())
 
     async def get_current_season_from_seq(self):
         """SEQギルドから最新シーズンを取得"""
@@ -93,13 +92,9 @@ class SeasonalRatingSync(commands.Cog):
         
         logger.debug(f"[SeasonalRatingSync] バッチ {batch_num}/{total_batches} 開始 ({len(guild_names)}ギルド)")
         
-        for i, guild_name in enumerate(guild_names):
+        for guild_name in guild_names:
             try:
-                # レート制限遵守
-                if i > 0:
-                    await asyncio.sleep(self.request_delay)
-                
-                # ギルド詳細データを取得
+                # ギルド詳細データを取得（レート制限はWynncraftAPI側の共有リミッターが守る）
                 guild_data = await self.api.get_guild_by_name(guild_name)
                 if not guild_data:
                     errors += 1
@@ -186,7 +181,7 @@ class SeasonalRatingSync(commands.Cog):
             
             # APIクライアントを初期化
             if not self.api:
-                self.api = WynncraftAPI()
+                self.api = WynncraftAPI(session=self.bot.http_client.session, priority=PRIORITY_BACKGROUND)
             
             # 最新シーズンを取得
             current_season = await self.get_current_season_from_seq()
@@ -200,6 +195,8 @@ class SeasonalRatingSync(commands.Cog):
             if not all_guilds_data:
                 logger.error("[SeasonalRatingSync] 全ギルドリスト取得失敗")
                 return
+            # オートコンプリート・ギルド解決用の共有ディレクトリも差分更新
+            get_guild_directory().update(all_guilds_data)
             
             all_guild_names = list(all_guilds_data.keys())
             total_guilds = len(all_guild_names)
@@ -262,6 +259,7 @@ class SeasonalRatingSync(commands.Cog):
             logger.info(f"  📊 結果: {total_processed:,}成功, {total_errors:,}エラー")
             logger.info(f"  ⏱️ 実行時間: {elapsed}")
             logger.info(f"  🎯 対象シーズン: {target_seasons}")
+            logger.info(f"  🚦 APIレート制限: {WynncraftAPI.rate_limiter.stats()}")
             
         except Exception as e:
             logger.error(f"SeasonalRatingSync効率化実行エラー: {e}", exc_info=True)
@@ -280,7 +278,7 @@ class SeasonalRatingSync(commands.Cog):
             await ctx.send("🚀 効率化版Seasonal Rating同期を開始...")
             
             if not self.api:
-                self.api = WynncraftAPI()
+                self.api = WynncraftAPI(session=self.bot.http_client.session, priority=PRIORITY_BACKGROUND)
             
             # 最新シーズンを取得
             status_msg = await ctx.send("🔍 SEQギルドから最新シーズンを取得中...")
@@ -295,6 +293,7 @@ class SeasonalRatingSync(commands.Cog):
             if not all_guilds_data:
                 await status_msg.edit(content="❌ 全ギルドリスト取得に失敗しました")
                 return
+            get_guild_directory().update(all_guilds_data)
             
             all_guild_names = list(all_guilds_data.keys())
             total_guilds = len(all_guild_names)
@@ -358,7 +357,7 @@ class SeasonalRatingSync(commands.Cog):
             status_msg = await ctx.send("📊 効率化版データベース状況を確認中...")
             
             if not self.api:
-                self.api = WynncraftAPI()
+                self.api = WynncraftAPI(session=self.bot.http_client.session, priority=PRIORITY_BACKGROUND)
             
             # 最新シーズンを確認
             api_current_season = await self.get_current_season_from_seq()
@@ -367,6 +366,8 @@ class SeasonalRatingSync(commands.Cog):
             # 全ギルドリスト取得
             all_guilds_data = await self.api.get_all_guilds()
             total_guilds_api = len(all_guilds_data.keys()) if all_guilds_data else 0
+            if all_guilds_data:
+                get_guild_directory().update(all_guilds_data)
             
             # 利用可能シーズンを取得
             seasons = get_available_seasons()